@@ -0,0 +1,39 @@
+"""files telegram file unique id
+
+Revision ID: 3d7b9c0e5a12
+Revises: e91a3f5b2d84
+Create Date: 2026-10-17 16:22:47.103582
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3d7b9c0e5a12"
+down_revision: Union[str, Sequence[str], None] = "e91a3f5b2d84"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "files",
+        sa.Column("telegram_file_unique_id", sa.String(length=64), nullable=True),
+    )
+    op.create_index(
+        "ix_files_user_id_telegram_file_unique_id",
+        "files",
+        ["user_id", "telegram_file_unique_id"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_files_user_id_telegram_file_unique_id", table_name="files")
+    op.drop_column("files", "telegram_file_unique_id")
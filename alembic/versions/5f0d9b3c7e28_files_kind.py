@@ -0,0 +1,32 @@
+"""files kind
+
+Revision ID: 5f0d9b3c7e28
+Revises: a6c2e8f41b95
+Create Date: 2026-10-17 19:42:31.507128
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5f0d9b3c7e28"
+down_revision: Union[str, Sequence[str], None] = "a6c2e8f41b95"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("files", sa.Column("kind", sa.String(length=16), nullable=True))
+    # Photos were the only uploads stored with this placeholder mime type;
+    # other existing rows stay NULL and are offered inline as documents
+    op.execute("UPDATE files SET kind = 'photo' WHERE mime_type = 'unknown/type'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("files", "kind")
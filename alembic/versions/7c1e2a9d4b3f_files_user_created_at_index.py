@@ -0,0 +1,34 @@
+"""files user created_at index
+
+Revision ID: 7c1e2a9d4b3f
+Revises: 49d46566c478
+Create Date: 2026-10-17 10:12:31.482913
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7c1e2a9d4b3f"
+down_revision: Union[str, Sequence[str], None] = "49d46566c478"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_files_user_id_created_at_id",
+        "files",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_files_user_id_created_at_id", table_name="files")
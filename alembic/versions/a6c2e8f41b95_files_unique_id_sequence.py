@@ -0,0 +1,30 @@
+"""files unique id sequence
+
+Revision ID: a6c2e8f41b95
+Revises: 3d7b9c0e5a12
+Create Date: 2026-10-17 17:05:12.894410
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a6c2e8f41b95"
+down_revision: Union[str, Sequence[str], None] = "3d7b9c0e5a12"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Increment must match FILE_ID_BLOCK in app/services/file_ids.py
+    op.execute("CREATE SEQUENCE files_unique_id_seq START WITH 1 INCREMENT BY 64")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP SEQUENCE files_unique_id_seq")
@@ -0,0 +1,143 @@
+"""user storage stats
+
+Revision ID: b4f8d21c6e07
+Revises: 7c1e2a9d4b3f
+Create Date: 2026-10-17 14:03:52.117406
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b4f8d21c6e07"
+down_revision: Union[str, Sequence[str], None] = "7c1e2a9d4b3f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "user_stats",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("file_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("total_bytes", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("last_upload_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_table(
+        "user_category_stats",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("category_id", sa.Integer(), nullable=False),
+        sa.Column("file_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("total_bytes", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("last_upload_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["category_id"], ["categories.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("user_id", "category_id"),
+    )
+
+    # Increments upsert the counter rows; decrements only update them, so a
+    # cascading user delete never tries to recreate stats for that user.
+    op.execute(
+        """
+        CREATE FUNCTION files_stats_apply(
+            p_user_id integer,
+            p_category_id integer,
+            p_count integer,
+            p_bytes bigint,
+            p_uploaded_at timestamptz
+        ) RETURNS void AS $$
+        BEGIN
+            IF p_count > 0 THEN
+                INSERT INTO user_stats AS s (user_id, file_count, total_bytes, last_upload_at)
+                VALUES (p_user_id, p_count, p_bytes, p_uploaded_at)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    file_count = s.file_count + EXCLUDED.file_count,
+                    total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+                    last_upload_at = GREATEST(s.last_upload_at, EXCLUDED.last_upload_at);
+
+                INSERT INTO user_category_stats AS s
+                    (user_id, category_id, file_count, total_bytes, last_upload_at)
+                VALUES (p_user_id, p_category_id, p_count, p_bytes, p_uploaded_at)
+                ON CONFLICT (user_id, category_id) DO UPDATE SET
+                    file_count = s.file_count + EXCLUDED.file_count,
+                    total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+                    last_upload_at = GREATEST(s.last_upload_at, EXCLUDED.last_upload_at);
+            ELSE
+                UPDATE user_stats SET
+                    file_count = file_count + p_count,
+                    total_bytes = total_bytes + p_bytes
+                WHERE user_id = p_user_id;
+
+                UPDATE user_category_stats SET
+                    file_count = file_count + p_count,
+                    total_bytes = total_bytes + p_bytes
+                WHERE user_id = p_user_id AND category_id = p_category_id;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION files_stats_trigger() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM files_stats_apply(
+                    OLD.user_id, OLD.category_id, -1, -COALESCE(OLD.size, 0), NULL
+                );
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM files_stats_apply(
+                    NEW.user_id, NEW.category_id, 1, COALESCE(NEW.size, 0), NEW.created_at
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER files_stats
+        AFTER INSERT OR DELETE OR UPDATE OF user_id, category_id, size ON files
+        FOR EACH ROW EXECUTE FUNCTION files_stats_trigger()
+        """
+    )
+
+    op.execute(
+        """
+        INSERT INTO user_stats (user_id, file_count, total_bytes, last_upload_at)
+        SELECT user_id, count(*), COALESCE(sum(size), 0), max(created_at)
+        FROM files
+        GROUP BY user_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO user_category_stats
+            (user_id, category_id, file_count, total_bytes, last_upload_at)
+        SELECT user_id, category_id, count(*), COALESCE(sum(size), 0), max(created_at)
+        FROM files
+        GROUP BY user_id, category_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER files_stats ON files")
+    op.execute("DROP FUNCTION files_stats_trigger()")
+    op.execute(
+        "DROP FUNCTION files_stats_apply(integer, integer, integer, bigint, timestamptz)"
+    )
+    op.drop_table("user_category_stats")
+    op.drop_table("user_stats")
@@ -0,0 +1,37 @@
+"""files name trigram index
+
+Revision ID: e91a3f5b2d84
+Revises: b4f8d21c6e07
+Create Date: 2026-10-17 15:41:08.563219
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e91a3f5b2d84"
+down_revision: Union[str, Sequence[str], None] = "b4f8d21c6e07"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "ix_files_name_trgm",
+        "files",
+        ["name"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_files_name_trgm", table_name="files")
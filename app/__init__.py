@@ -1,4 +1,4 @@
-from .models import User, Category, File
+from .models import User, Category, File, UserStats, UserCategoryStats
 from .database import async_session
 from .middlewares import DbSessionMiddleware
 
@@ -6,6 +6,8 @@ __all__ = [
     "User",
     "Category",
     "File",
+    "UserStats",
+    "UserCategoryStats",
     "async_session",
     "DbSessionMiddleware",
 ]
@@ -1,44 +1,123 @@
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
 from aiogram.enums import ParseMode
 from decouple import config
 
-from app.middlewares import DbSessionMiddleware
+from app.database import DB_WARM_POOL, engine, replicas, warm_pool
+from app.fsm_storage import create_storage
+from app.metrics import (
+    METRICS_ENABLED,
+    ApiMetricsMiddleware,
+    HandlerMetricsMiddleware,
+    MetricsMiddleware,
+    MetricsServer,
+    instrument_engine,
+)
+from app.middlewares import (
+    THROTTLE_ENABLED,
+    DbSessionMiddleware,
+    ThrottlingMiddleware,
+)
+from app.outbound import OUTBOUND_SCHEDULER, SendScheduler
+from app.profiler import (
+    PROFILER_ENABLED,
+    ProfileHandlerMiddleware,
+    SlowUpdateProfiler,
+    profile_engine,
+)
+from app.webhook import start_webhook
+from app.services.ingest_journal import journal
 from app.handlers import (
     user_commands,
     file_handlers,
     callback_handlers,
     file_commands,
     category_handlers,
+    search_handlers,
+    inline_handlers,
 )
 
+BOT_MODE = config("BOT_MODE", default="polling")
+UPDATES_CONCURRENCY_LIMIT = config("UPDATES_CONCURRENCY_LIMIT", default=100, cast=int)
+
 
-def create_bot() -> Bot:
+def create_bot(session: BaseSession | None = None) -> Bot:
     """Create and configure bot instance"""
-    return Bot(
+    bot = Bot(
         token=config("BOT_TOKEN"),
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
 
+    # Registered first so it wraps everything else, and API timings exclude waits
+    if OUTBOUND_SCHEDULER:
+        bot.session.middleware(SendScheduler())
+
+    if METRICS_ENABLED:
+        bot.session.middleware(ApiMetricsMiddleware())
+
+    return bot
+
 
 def create_dispatcher() -> Dispatcher:
     """Create and configure dispatcher with all handlers and middleware"""
-    dp = Dispatcher()
+    dp = Dispatcher(storage=create_storage())
 
     dp.include_router(user_commands.router)
     dp.include_router(file_handlers.router)
     dp.include_router(callback_handlers.router)
     dp.include_router(file_commands.router)
+    dp.include_router(search_handlers.router)
+    dp.include_router(inline_handlers.router)
     dp.include_router(category_handlers.router)
 
-    dp.update.middleware(DbSessionMiddleware())
+    if PROFILER_ENABLED:
+        for db_engine in (engine, *replicas.engines):
+            profile_engine(db_engine)
+        dp.update.middleware(SlowUpdateProfiler())
+        for observer in (dp.message, dp.callback_query, dp.inline_query):
+            observer.middleware(ProfileHandlerMiddleware())
+
+    if METRICS_ENABLED:
+        for db_engine in (engine, *replicas.engines):
+            instrument_engine(db_engine)
+        dp.update.middleware(MetricsMiddleware())
+        for observer in (dp.message, dp.callback_query, dp.inline_query):
+            observer.middleware(HandlerMetricsMiddleware())
+
+        metrics_server = MetricsServer(engine)
+        dp.startup.register(metrics_server.start)
+        dp.shutdown.register(metrics_server.stop)
+
+    # Throttling runs per update, before any handler gets a session
+    if THROTTLE_ENABLED:
+        dp.update.middleware(ThrottlingMiddleware())
+
+    # Per handler, so unhandled updates get no session and flags are visible
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.middleware(DbSessionMiddleware())
+
+    if DB_WARM_POOL:
+        dp.startup.register(warm_pool)
+
+    if replicas.engines:
+        dp.startup.register(replicas.start)
+        dp.shutdown.register(replicas.stop)
+
+    if journal is not None:
+        dp.startup.register(journal.start)
+        dp.shutdown.register(journal.stop)
 
     return dp
 
 
 async def start_bot():
-    """Start the bot"""
+    """Start the bot in polling or webhook mode depending on BOT_MODE"""
     bot = create_bot()
     dp = create_dispatcher()
 
-    await dp.start_polling(bot)
+    if BOT_MODE == "webhook":
+        await start_webhook(bot, dp, concurrency_limit=UPDATES_CONCURRENCY_LIMIT)
+    else:
+        await dp.start_polling(bot, tasks_concurrency_limit=UPDATES_CONCURRENCY_LIMIT)
@@ -1,10 +1,20 @@
+import asyncio
+import logging
+from contextvars import ContextVar
+from itertools import count
+from uuid import uuid4
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
 )
-from sqlalchemy.orm import DeclarativeBase
-from decouple import config
+from typing import Callable
+from sqlalchemy import Select, event, text
+from sqlalchemy.orm import DeclarativeBase, ORMExecuteState, Session
+from decouple import Csv, config
+
+from app.cache import TTLCache
 
 DB_USER = config("DB_USER")
 DB_PASSWORD = config("DB_PASSWORD")
@@ -13,18 +23,281 @@ DB_PORT = config("DB_PORT")
 DB_NAME = config("DB_NAME")
 DB_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_async_engine(DB_URL, echo=True)
+# Engine profile: "dev" (SQL echo), "prod" (tuned pool) or "pgbouncer"
+# (transaction pooling, so no server-side prepared statement caching)
+DB_PROFILE = config("DB_PROFILE", default="dev")
+DB_ECHO = config("DB_ECHO", default=DB_PROFILE == "dev", cast=bool)
+DB_POOL_SIZE = config("DB_POOL_SIZE", default=10, cast=int)
+DB_MAX_OVERFLOW = config("DB_MAX_OVERFLOW", default=20, cast=int)
+DB_POOL_TIMEOUT = config("DB_POOL_TIMEOUT", default=30, cast=float)
+DB_POOL_RECYCLE = config("DB_POOL_RECYCLE", default=1800, cast=int)
+DB_POOL_PRE_PING = config("DB_POOL_PRE_PING", default=True, cast=bool)
+DB_STATEMENT_CACHE_SIZE = config("DB_STATEMENT_CACHE_SIZE", default=500, cast=int)
+DB_WARM_POOL = config("DB_WARM_POOL", default=False, cast=bool)
+
+# Optional read replicas as host:port, sharing the primary's credentials
+DB_REPLICA_HOSTS = config("DB_REPLICA_HOSTS", default="", cast=Csv())
+DB_REPLICA_CHECK_INTERVAL = config("DB_REPLICA_CHECK_INTERVAL", default=5.0, cast=float)
+DB_REPLICA_MAX_LAG = config("DB_REPLICA_MAX_LAG", default=5.0, cast=float)
+# How long a user's reads stay on the primary after they wrote something
+DB_REPLICA_PIN_SECONDS = config("DB_REPLICA_PIN_SECONDS", default=5.0, cast=float)
+
+logger = logging.getLogger(__name__)
+
+
+def engine_options(profile: str) -> dict:
+    """Keyword arguments for create_async_engine for a given profile"""
+    if profile == "dev":
+        return {"echo": DB_ECHO}
+
+    pool_options = {
+        "echo": DB_ECHO,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+    if profile == "prod":
+        return {
+            **pool_options,
+            "connect_args": {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+        }
+
+    if profile == "pgbouncer":
+        return {
+            **pool_options,
+            "connect_args": {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            },
+        }
+
+    raise ValueError(f"Unknown DB_PROFILE: {profile}")
+
+
+engine = create_async_engine(DB_URL, **engine_options(DB_PROFILE))
+
+
+class ReplicaSet:
+    """Read replicas handed out round-robin, skipping ones failing health checks.
+
+    A replica is healthy when it answers and its replay lag is within
+    ``max_lag`` seconds. A replica that has replayed all the WAL it has
+    received has no lag, however long ago the primary last wrote.
+    """
+
+    def __init__(
+        self,
+        engines: list[AsyncEngine],
+        check_interval: float = DB_REPLICA_CHECK_INTERVAL,
+        max_lag: float = DB_REPLICA_MAX_LAG,
+    ):
+        self.engines = engines
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.healthy = list(engines)
+        self._turn = count()
+        self._checker: asyncio.Task | None = None
 
-async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    def pick(self) -> AsyncEngine | None:
+        """Next healthy replica, or None when there is none"""
+        healthy = self.healthy
+        return healthy[next(self._turn) % len(healthy)] if healthy else None
 
+    async def check(self):
+        results = await asyncio.gather(*(self._is_healthy(e) for e in self.engines))
+        self.healthy = [e for e, ok in zip(self.engines, results) if ok]
 
-async def get_db_session():
-    async with async_session() as session:
+    async def _is_healthy(self, replica: AsyncEngine) -> bool:
         try:
-            yield session
-        finally:
+            async with replica.connect() as connection:
+                # The last replayed transaction ages while the primary is
+                # idle, so only count it once replay falls behind receipt
+                lag = await connection.scalar(
+                    text(
+                        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+                        "THEN 0 ELSE COALESCE(EXTRACT(EPOCH FROM "
+                        "now() - pg_last_xact_replay_timestamp()), 0) END"
+                    )
+                )
+        except Exception as e:
+            logger.warning(f"Replica {replica.url.host} failed its health check: {e}")
+            return False
+        if lag > self.max_lag:
+            logger.warning(f"Replica {replica.url.host} is {lag:.1f}s behind")
+            return False
+        return True
+
+    async def start(self, **kwargs):
+        await self.check()
+        self._checker = asyncio.create_task(self._check_forever())
+
+    async def stop(self, **kwargs):
+        if self._checker:
+            self._checker.cancel()
+        for replica in self.engines:
+            await replica.dispose()
+
+    async def _check_forever(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+
+replicas = ReplicaSet(
+    [
+        create_async_engine(
+            f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{host}/{DB_NAME}",
+            **engine_options(DB_PROFILE),
+        )
+        for host in DB_REPLICA_HOSTS
+    ]
+)
+
+# Users who wrote recently, whose reads must see their own writes
+_pinned_to_primary = TTLCache(maxsize=100_000, ttl=DB_REPLICA_PIN_SECONDS)
+
+
+def use_replica(user_id: int | None) -> bool:
+    """Whether a read-only update from this user may be served by a replica.
+
+    Pins live in this process only, so read-your-writes holds within one
+    webhook worker; another worker may still read a lagging replica.
+    """
+    return bool(replicas.engines) and (
+        user_id is None or user_id not in _pinned_to_primary
+    )
+
+
+class RoutingSession(Session):
+    """Session sending plain SELECTs to a replica when ``info["replica"]`` is set.
+
+    The replica is chosen once per session so its reads share a snapshot
+    source; writes, flushes and anything else go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        use_replica = self.info.get("replica") and not self._flushing
+        if use_replica and isinstance(clause, Select):
+            if "replica_engine" not in self.info:
+                self.info["replica_engine"] = replicas.pick() or engine
+            return self.info["replica_engine"].sync_engine
+        return engine.sync_engine
+
+
+async_session = async_sessionmaker(
+    class_=AsyncSession, sync_session_class=RoutingSession, expire_on_commit=False
+)
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], None]):
+    """Run ``callback`` once the session's current transaction commits.
+
+    Used for in-process cache updates, so they never reflect writes that
+    end up rolled back.
+    """
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_statement_write(state: ORMExecuteState):
+    if not state.is_select:
+        state.session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flush_write(session: Session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session: Session):
+    user_id = session.info.get("user_id")
+    if session.info.get("has_writes") and user_id is not None:
+        _pinned_to_primary.set(user_id, True)
+    session.info["has_writes"] = False
+    for callback in session.info.pop("after_commit", ()):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_commit(session: Session):
+    session.info["has_writes"] = False
+    session.info.pop("after_commit", None)
+
+
+async def warm_pool(**kwargs):
+    """Open pool_size connections up front so the first burst skips connection setup"""
+    connections = await asyncio.gather(
+        *(engine.connect() for _ in range(engine.pool.size()))
+    )
+    for connection in connections:
+        await connection.close()
+
+
+class LazySession:
+    """Stand-in for AsyncSession that only opens the real session on first use.
+
+    Handlers that never touch the database cost no session and no pool
+    checkout; ``close`` is a no-op unless the session was actually used.
+    """
+
+    __slots__ = ("_factory", "_info", "_session")
+
+    def __init__(
+        self,
+        factory: async_sessionmaker[AsyncSession] = async_session,
+        info: dict | None = None,
+    ):
+        self._factory = factory
+        self._info = info or {}
+        self._session: AsyncSession | None = None
+
+    @property
+    def is_opened(self) -> bool:
+        return self._session is not None
+
+    @property
+    def has_writes(self) -> bool:
+        """Whether the session holds uncommitted changes, flushed or pending"""
+        session = self._session
+        return session is not None and bool(
+            session.info.get("has_writes")
+            or session.new
+            or session.dirty
+            or session.deleted
+        )
+
+    def __getattr__(self, name: str):
+        if self._session is None:
+            self._session = self._factory(info=dict(self._info))
+        return getattr(self._session, name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            session, self._session = self._session, None
             await session.close()
 
+# Session of the update being handled, set by DbSessionMiddleware
+current_session: ContextVar[LazySession | None] = ContextVar(
+    "current_session", default=None
+)
+
+
+async def release_current_session():
+    """Return the current update's connection to the pool before a long wait.
+
+    Only a session without writes is closed, since closing ends its
+    transaction; one with writes keeps its connection until the middleware
+    commits or rolls back. Later use opens a new session.
+    """
+    session = current_session.get()
+    if session is not None and session.is_opened and not session.has_writes:
+        await session.close()
+
 
 class Base(DeclarativeBase):
     pass
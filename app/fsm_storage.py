@@ -0,0 +1,112 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from decouple import config
+
+# Conversation state storage: "memory" (default) or "sqlite"
+FSM_STORAGE = config("FSM_STORAGE", default="memory")
+FSM_STORAGE_PATH = config("FSM_STORAGE_PATH", default="fsm_state.sqlite3")
+
+
+class SqliteStorage(BaseStorage):
+    """FSM storage kept in a local SQLite file, so states survive restarts.
+
+    Several bot processes on one host can share the file, so a call may
+    wait up to ``busy_timeout`` for another process's write lock. Calls run
+    in a worker thread to keep that wait off the event loop, one at a time
+    as the connection is shared.
+    """
+
+    def __init__(self, path: str = FSM_STORAGE_PATH):
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=1000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}')"
+        )
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ":".join(
+            str(part)
+            for part in (
+                key.bot_id,
+                key.chat_id,
+                key.user_id,
+                key.thread_id or "",
+                key.business_connection_id or "",
+                key.destiny,
+            )
+        )
+
+    def _run(self, *statements: tuple[str, tuple]) -> Optional[tuple]:
+        """Execute statements in order, returning the last one's first row"""
+        with self._lock:
+            row = None
+            for sql, params in statements:
+                row = self._db.execute(sql, params).fetchone()
+            return row
+
+    async def _execute(self, *statements: tuple[str, tuple]) -> Optional[tuple]:
+        return await asyncio.to_thread(self._run, *statements)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await self._execute(
+            (
+                "INSERT INTO fsm (key, state) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET state = excluded.state",
+                (self._key(key), state),
+            ),
+            self._prune(key),
+        )
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._execute(
+            ("SELECT state FROM fsm WHERE key = ?", (self._key(key),))
+        )
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self._execute(
+            (
+                "INSERT INTO fsm (key, data) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET data = excluded.data",
+                (self._key(key), json.dumps(dict(data))),
+            ),
+            self._prune(key),
+        )
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._execute(
+            ("SELECT data FROM fsm WHERE key = ?", (self._key(key),))
+        )
+        return json.loads(row[0]) if row else {}
+
+    def _prune(self, key: StorageKey) -> tuple[str, tuple]:
+        """Statement dropping the row of a conversation that was cleared"""
+        return (
+            "DELETE FROM fsm WHERE key = ? AND state IS NULL AND data = '{}'",
+            (self._key(key),),
+        )
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._db.close)
+
+
+def create_storage(kind: str = FSM_STORAGE) -> BaseStorage:
+    """Storage for conversation states selected by FSM_STORAGE"""
+    if kind == "sqlite":
+        return SqliteStorage()
+    if kind == "memory":
+        return MemoryStorage()
+    raise ValueError(f"Unknown FSM_STORAGE: {kind}")
@@ -1,26 +1,39 @@
+import asyncio
 import logging
+from typing import NamedTuple
 from aiogram import Router, F
-from aiogram.types import CallbackQuery
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 
-from app.services.user_service import get_or_create_user
-from app.services.file_service import get_user_files, get_user_files_count
+from app.cache import TTLCache
+from app.database import async_session
+from app.metrics import register_cache
+from app.services.user_service import get_or_create_user, get_user_with_stats
+from app.services.download_service import get_download
+from app.services.file_service import (
+    get_user_files,
+    get_user_files_page,
+    get_user_files_count_cached,
+    library_version,
+    encode_file_cursor,
+    decode_file_cursor,
+)
 from app.keyboards import (
     main_menu_keyboard,
     back_to_menu_keyboard,
     files_pagination_keyboard,
     files_list_keyboard,
 )
-from app.models import File, User
 
 router = Router()
 logger = logging.getLogger(__name__)
 
 @router.callback_query(F.data == "menu_back")
-async def menu_back_handler(callback: CallbackQuery):
-    """Handle back to menu button"""
+async def menu_back_handler(callback: CallbackQuery, state: FSMContext):
+    """Handle back to menu button, abandoning any pending input"""
+    if await state.get_state() is not None:
+        await state.clear()
     await callback.message.edit_text("Main Menu:", reply_markup=main_menu_keyboard())
     await callback.answer()
 
@@ -44,40 +57,64 @@ async def menu_upload_handler(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data == "menu_my_files")
+@router.callback_query(F.data == "menu_my_files", flags={"read_only": True})
 async def menu_my_files_handler(callback: CallbackQuery, session: AsyncSession):
     """Handle my files button - show first page"""
     logger.info(f"User {callback.from_user.id} clicked My Files")
     await show_files_page(callback, session, page=1)
 
 
-@router.callback_query(F.data.startswith("files_page_"))
+@router.callback_query(F.data.startswith("files_page_"), flags={"read_only": True})
 async def files_page_handler(callback: CallbackQuery, session: AsyncSession):
     """Handle pagination buttons"""
     try:
-        page = int(callback.data.replace("files_page_", ""))
-        await show_files_page(callback, session, page)
+        page, backward, cursor = parse_files_page_data(callback.data)
     except ValueError:
         await callback.answer("Invalid page number.", show_alert=True)
+        return
+
+    await show_files_page(callback, session, page, cursor=cursor, backward=backward)
+
+
+def parse_files_page_data(data: str) -> tuple[int, bool, str | None]:
+    """Parse ``files_page_<page>[_<n|p>_<cursor>]`` callback data"""
+    parts = data.replace("files_page_", "").split("_")
+    page = int(parts[0])
+
+    if len(parts) == 1:
+        return page, False, None
+    if len(parts) != 3 or parts[1] not in ("n", "p"):
+        raise ValueError(f"Malformed pagination data: {data}")
+
+    decode_file_cursor(parts[2])
+    return page, parts[1] == "p", parts[2]
+
+
+async def show_files_page(
+    callback: CallbackQuery,
+    session: AsyncSession,
+    page: int,
+    cursor: str | None = None,
+    backward: bool = False,
+    limit: int = 10,
+):
+    """Show a specific page of user's files.
+
+    Pages after the first are fetched by keyset from the cursor carried in
+    the button, so deep pages cost the same as the first one.
+    """
+    if page < 1:
+        await callback.answer("Invalid page number.", show_alert=True)
+        return
 
-async def show_files_page(callback: CallbackQuery, session: AsyncSession, page: int, limit: int = 10):
-    """Show a specific page of user's files"""
-    from app.services.file_service import get_user_files, get_user_files_count
-    from app.keyboards import files_pagination_keyboard, files_list_keyboard
-    
     db_user = await get_or_create_user(session, callback.from_user)
-    
-    offset = (page - 1) * limit
-    
-    files = await get_user_files(session, db_user.id, offset=offset, limit=limit)
-    total_files = await get_user_files_count(session, db_user.id)
-    total_pages = (total_files + limit - 1) // limit  
-    
-    if not files:
+    rendered = await get_files_page(session, db_user.id, page, cursor, backward, limit)
+
+    if rendered is None:
         if page > 1:
             await callback.answer("No more files to show.", show_alert=True)
             return
-        
+
         await callback.message.edit_text(
             "📭 <b>Your storage is empty!</b>\n\n"
             "Send me any file (document, photo, video, audio) and I'll save it for you!\n\n"
@@ -85,30 +122,137 @@ async def show_files_page(callback: CallbackQuery, session: AsyncSession, page:
             reply_markup=back_to_menu_keyboard(),
         )
         return
-    
-    if page < 1 or page > total_pages:
-        await callback.answer("Invalid page number.", show_alert=True)
-        return
-    
-    message_text = files_list_keyboard(files, page, total_pages, total_files, offset)
-    keyboard = files_pagination_keyboard(files, page, total_pages, offset)
-    
+
     await callback.message.edit_text(
-        message_text,
-        reply_markup=keyboard,
+        rendered.text,
+        reply_markup=rendered.keyboard,
     )
     await callback.answer()
 
 
-@router.callback_query(F.data == "menu_profile")
+class RenderedFilesPage(NamedTuple):
+    text: str
+    keyboard: InlineKeyboardMarkup
+    next_cursor: str | None
+
+
+# Rendered pages keyed by (user, page, cursor, direction, library version);
+# the TTL must stay below that of the library versions in file_service
+_page_cache = TTLCache(maxsize=2048, ttl=120)
+register_cache("files_pages", _page_cache)
+_prefetches: dict[tuple, asyncio.Task] = {}
+
+
+async def get_files_page(
+    session: AsyncSession,
+    user_id: int,
+    page: int,
+    cursor: str | None,
+    backward: bool,
+    limit: int,
+) -> RenderedFilesPage | None:
+    """Get a rendered page from the cache, rendering it on a miss.
+
+    Once a page is shown, the following page is rendered in the background
+    so that the usual "Next" click is served without a database query.
+    """
+    key = (user_id, page, cursor, backward, library_version(user_id))
+    rendered = _page_cache.get(key)
+    if rendered is None:
+        rendered = await render_files_page(
+            session, user_id, page, cursor, backward, limit
+        )
+        if rendered is None:
+            return None
+        _page_cache.set(key, rendered)
+
+    if rendered.next_cursor:
+        # Same routing as the page being shown, so a pinned user stays on the primary
+        replica = session.info.get("replica", False)
+        prefetch_files_page(user_id, page + 1, rendered.next_cursor, limit, replica)
+
+    return rendered
+
+
+def prefetch_files_page(
+    user_id: int, page: int, cursor: str, limit: int, replica: bool = False
+):
+    """Render a page in the background with its own session, unless cached already"""
+    key = (user_id, page, cursor, False, library_version(user_id))
+    if key in _prefetches or key in _page_cache:
+        return
+
+    async def prefetch():
+        try:
+            async with async_session(info={"replica": replica}) as session:
+                rendered = await render_files_page(
+                    session, user_id, page, cursor, False, limit
+                )
+            if rendered is not None and key[-1] == library_version(user_id):
+                _page_cache.set(key, rendered)
+        except Exception as e:
+            logger.warning(f"Failed to prefetch files page {page} for {user_id}: {e}")
+        finally:
+            del _prefetches[key]
+
+    _prefetches[key] = asyncio.create_task(prefetch())
+
+
+async def render_files_page(
+    session: AsyncSession,
+    user_id: int,
+    page: int,
+    cursor: str | None,
+    backward: bool,
+    limit: int,
+) -> RenderedFilesPage | None:
+    """Query and render one page of files, or None if it has no files"""
+    offset = (page - 1) * limit
+
+    if cursor is None:
+        files = await get_user_files(session, user_id, offset=offset, limit=limit + 1)
+        has_next = len(files) > limit
+        files = files[:limit]
+        has_previous = page > 1
+    else:
+        files, has_more = await get_user_files_page(
+            session, user_id, cursor, limit=limit, backward=backward
+        )
+        has_next = True if backward else has_more
+        has_previous = has_more if backward else page > 1
+
+    if not files:
+        return None
+
+    if has_next:
+        total_files = max(
+            await get_user_files_count_cached(session, user_id),
+            offset + len(files) + 1,
+        )
+    else:
+        total_files = offset + len(files)
+    total_pages = (total_files + limit - 1) // limit
+
+    next_cursor = encode_file_cursor(files[-1]) if has_next else None
+    message_text = files_list_keyboard(files, page, total_pages, total_files, offset)
+    keyboard = files_pagination_keyboard(
+        files,
+        page,
+        offset,
+        prev_data=(
+            f"files_page_{page - 1}_p_{encode_file_cursor(files[0])}"
+            if has_previous
+            else None
+        ),
+        next_data=f"files_page_{page + 1}_n_{next_cursor}" if next_cursor else None,
+    )
+    return RenderedFilesPage(message_text, keyboard, next_cursor)
+
+
+@router.callback_query(F.data == "menu_profile", flags={"read_only": True})
 async def menu_profile_handler(callback: CallbackQuery, session: AsyncSession):
     """Handle profile button"""
-    result = await session.execute(
-        select(User)
-        .where(User.telegram_id == callback.from_user.id)
-        .options(selectinload(User.files))
-    )
-    db_user = result.scalar_one_or_none()
+    db_user, stats = await get_user_with_stats(session, callback.from_user.id)
 
     if not db_user:
         await callback.answer("User not found.", show_alert=True)
@@ -119,13 +263,22 @@ async def menu_profile_handler(callback: CallbackQuery, session: AsyncSession):
         f"Telegram ID: {db_user.telegram_id}\n"
         f"Username: @{db_user.username or 'N/A'}\n"
         f"Name: {db_user.first_name or ''} {db_user.last_name or ''}\n"
-        f"Files Stored: {len(db_user.files)}"
+        f"Files Stored: {stats.file_count if stats else 0}\n"
+        f"Storage Used: {format_size(stats.total_bytes if stats else 0)}"
     )
 
     await callback.message.edit_text(profile_text, reply_markup=back_to_menu_keyboard())
     await callback.answer()
 
 
+def format_size(size: int) -> str:
+    """Format a byte count for display"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
 @router.callback_query(F.data == "menu_help")
 async def menu_help_handler(callback: CallbackQuery):
     """Handle help button"""
@@ -138,40 +291,27 @@ async def menu_help_handler(callback: CallbackQuery):
     await callback.message.edit_text(help_text, reply_markup=back_to_menu_keyboard())
     await callback.answer()
 
-@router.callback_query(F.data.startswith("file_get_"))
+@router.callback_query(F.data.startswith("file_get_"), flags={"read_only": True})
 async def get_file_handler(callback: CallbackQuery, session: AsyncSession):
     """Handle file download button from pagination"""
     file_unique_id = callback.data.replace("file_get_", "")
-    
-    await callback.answer("Fetching your file...")
-    
- 
-    from sqlalchemy.orm import selectinload
-    result = await session.execute(
-        select(File)
-        .where(File.unique_id == file_unique_id)
-        .options(selectinload(File.user)) 
-    )
-    file_to_send = result.scalar_one_or_none()
+    download = await get_download(session, file_unique_id)
 
-    if not file_to_send:
+    if not download:
         await callback.answer("❌ File not found.", show_alert=True)
         return
 
-    if file_to_send.user.telegram_id != callback.from_user.id:
+    if download.owner_telegram_id != callback.from_user.id:
         await callback.answer("❌ You don't have permission to access this file.", show_alert=True)
         return
 
+    await callback.answer("Fetching your file...")
     try:
-  
         await callback.message.bot.send_document(
             chat_id=callback.from_user.id,
-            document=file_to_send.telegram_file_id,
-            caption=f"📁 <b>{file_to_send.name}</b>\n\nID: <code>{file_to_send.unique_id}</code>"
+            document=download.telegram_file_id,
+            caption=f"📁 <b>{download.name}</b>\n\nID: <code>{download.unique_id}</code>",
         )
- 
-        await callback.answer("✅ File sent successfully!")
-        
     except Exception as e:
         logger.error(f"Failed to send file: {e}")
-        await callback.answer("❌ Sorry, couldn't send the file. It may have expired.", show_alert=True)
+        await callback.message.answer("❌ Sorry, couldn't send the file. It may have expired.")
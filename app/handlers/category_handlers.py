@@ -1,4 +1,6 @@
 from aiogram import Router, F
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, Message
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -22,6 +24,10 @@ router = Router()
 logger = logging.getLogger(__name__)
 
 
+class CategoryForm(StatesGroup):
+    name = State()
+
+
 @router.callback_query(F.data == "menu_upload")
 async def menu_upload_handler(callback: CallbackQuery, session: AsyncSession):
     """Handle upload button - show category management"""
@@ -49,6 +55,8 @@ async def menu_upload_handler(callback: CallbackQuery, session: AsyncSession):
     await callback.answer()
 
 
+# Not read_only: get_user_current_category may assign General, and that
+# must not be decided from a lagging replica
 @router.callback_query(F.data == "switch_category")
 async def switch_category_handler(callback: CallbackQuery, session: AsyncSession):
     """Show list of categories to switch to"""
@@ -93,8 +101,9 @@ async def select_category_handler(callback: CallbackQuery, session: AsyncSession
 
 
 @router.callback_query(F.data == "create_category")
-async def create_category_handler(callback: CallbackQuery):
+async def create_category_handler(callback: CallbackQuery, state: FSMContext):
     """Prompt user to create a new category"""
+    await state.set_state(CategoryForm.name)
     await callback.message.edit_text(
         "📝 <b>Create New Category</b>\n\n"
         "Please send me the name for your new category.\n\n"
@@ -104,10 +113,13 @@ async def create_category_handler(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.message(F.text & ~F.command)
-async def handle_category_name(message: Message, session: AsyncSession):
-    """Handle category name input"""
+@router.message(CategoryForm.name, F.text & ~F.command)
+async def handle_category_name(
+    message: Message, session: AsyncSession, state: FSMContext
+):
+    """Handle category name input after "Create New Category" was pressed"""
     if len(message.text) > 2 and len(message.text) < 50:
+        await state.clear()
         db_user = await get_or_create_user(session, message.from_user)
 
         category = await get_or_create_category(session, message.text, db_user.id)
@@ -124,3 +136,12 @@ async def handle_category_name(message: Message, session: AsyncSession):
             "Please provide a valid category name (3-50 characters).",
             reply_markup=back_to_menu_keyboard(),
         )
+
+
+@router.message(F.text & ~F.command)
+async def handle_unexpected_text(message: Message):
+    """Answer text that is not part of a conversation without touching the database"""
+    await message.answer(
+        "Send me a file to save it, or open the menu with /menu.",
+        reply_markup=back_to_menu_keyboard(),
+    )
@@ -2,15 +2,14 @@ from aiogram import Router
 from aiogram.types import Message
 from aiogram.filters import Command, CommandObject
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.models import File
+from app.services.download_service import get_download
 import logging
 
 logger = logging.getLogger(__name__)
 router = Router()
 
 
-@router.message(Command("get"))
+@router.message(Command("get"), flags={"read_only": True})
 async def get_file_command(
     message: Message, command: CommandObject, session: AsyncSession
 ):
@@ -27,23 +26,23 @@ async def get_file_command(
 
     logger.info(f"User {message.from_user.id} requested file: {file_unique_id}")
 
-    result = await session.execute(select(File).where(File.unique_id == file_unique_id))
-    file_to_send = result.scalar_one_or_none()
+    download = await get_download(session, file_unique_id)
 
-    if not file_to_send:
+    if not download:
         await message.answer("❌ File not found. Please check the file ID.")
         return
 
-    if file_to_send.user.telegram_id != message.from_user.id:
+    if download.owner_telegram_id != message.from_user.id:
         await message.answer("❌ You don't have permission to access this file.")
         return
 
     try:
         await message.answer_document(
-            document=file_to_send.telegram_file_id,
-            caption=f"📁 <b>{file_to_send.name}</b>\n\nID: <code>{file_to_send.unique_id}</code>",
+            document=download.telegram_file_id,
+            caption=f"📁 <b>{download.name}</b>\n\nID: <code>{download.unique_id}</code>",
         )
 
     except Exception as e:
         logger.error(f"Failed to send file: {e}")
         await message.answer("❌ Sorry, couldn't send the file. It may have expired.")
+
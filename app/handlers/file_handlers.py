@@ -1,51 +1,106 @@
+import asyncio
 from aiogram import Router, F
 from aiogram.types import Message
 from sqlalchemy.ext.asyncio import AsyncSession
+from decouple import config
 
-from app.services.user_service import get_or_create_user
-from app.services.file_service import get_general_category, create_file_record
-from app.services.category_service import get_user_current_category
+from app.services.file_service import ingest_file, ingest_files
 from app.keyboards import main_menu_keyboard
 import logging
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+# Seconds to wait for the rest of an album after its first message arrives
+MEDIA_GROUP_WINDOW = config("MEDIA_GROUP_WINDOW", default=1.0, cast=float)
 
-@router.message(F.document | F.photo | F.video | F.audio)
-async def handle_file_message(message: Message, session: AsyncSession):
-    """Handle all file uploads with category support"""
-    db_user = await get_or_create_user(session, message.from_user)
-    current_category = await get_user_current_category(session, db_user.id)
+_media_groups: dict[str, list[Message]] = {}
 
-    if not current_category:
-        current_category = await get_general_category(session)
 
+def extract_file_data(message: Message) -> dict | None:
+    """Build file record fields from a message, or None for unsupported content"""
     if message.document:
-        file_obj = message.document
+        kind, file_obj = "document", message.document
     elif message.photo:
-        file_obj = message.photo[-1]
+        kind, file_obj = "photo", message.photo[-1]
     elif message.video:
-        file_obj = message.video
+        kind, file_obj = "video", message.video
     elif message.audio:
-        file_obj = message.audio
+        kind, file_obj = "audio", message.audio
     else:
-        await message.answer("Unsupported file type.")
-        return
+        return None
 
-    file_data = {
-        "name": file_obj.file_name or "Unnamed File",
+    return {
+        "name": getattr(file_obj, "file_name", None) or "Unnamed File",
         "mime_type": getattr(file_obj, "mime_type", "unknown/type"),
+        "kind": kind,
         "size": file_obj.file_size,
         "telegram_file_id": file_obj.file_id,
+        "telegram_file_unique_id": file_obj.file_unique_id,
     }
 
-    new_file = await create_file_record(
-        session, file_data, db_user.id, current_category.id
+
+@router.message(F.media_group_id, F.document | F.photo | F.video | F.audio)
+async def handle_media_group(message: Message, session: AsyncSession):
+    """Collect an album and save all of its files at once.
+
+    The first message of a group waits briefly for its siblings, which only
+    append themselves to the buffer, then stores the whole album with one
+    statement and sends a single summary reply.
+    """
+    group = _media_groups.get(message.media_group_id)
+    if group is not None:
+        group.append(message)
+        return
+
+    group = _media_groups[message.media_group_id] = [message]
+    try:
+        await asyncio.sleep(MEDIA_GROUP_WINDOW)
+    finally:
+        del _media_groups[message.media_group_id]
+
+    group.sort(key=lambda item: item.message_id)
+    files_data = [data for data in map(extract_file_data, group) if data]
+
+    saved, current_category = await ingest_files(
+        session, message.from_user, files_data
+    )
+    # Commit before acknowledging, so a reported save is durable
+    await session.commit()
+
+    file_list = "".join(
+        f"{i}. {file.name} (ID: <code>{file.unique_id}</code>)"
+        f"{'' if created else ' ♻️ already saved'}\n"
+        for i, (file, created) in enumerate(saved, 1)
+    )
+    success_message = (
+        f"✅ <b>{len(saved)} files saved successfully!</b>\n\n"
+        f"📂 <b>Category:</b> {current_category.name}\n\n"
+        f"{file_list}\n"
+        f"🔹 <b>To download later:</b>\n"
+        f"• Click <b>My Files</b> in the menu\n"
+        f"• Or use: <code>/get file_id</code>"
+    )
+    await message.answer(success_message, reply_markup=main_menu_keyboard())
+
+
+@router.message(F.document | F.photo | F.video | F.audio)
+async def handle_file_message(message: Message, session: AsyncSession):
+    """Handle all file uploads with category support"""
+    file_data = extract_file_data(message)
+    if file_data is None:
+        await message.answer("Unsupported file type.")
+        return
+
+    new_file, created, current_category = await ingest_file(
+        session, message.from_user, file_data
     )
+    # Commit before acknowledging, so a reported save is durable
+    await session.commit()
 
+    title = "✅ <b>File saved successfully!</b>" if created else "♻️ <b>File already saved</b>"
     success_message = (
-        f"✅ <b>File saved successfully!</b>\n\n"
+        f"{title}\n\n"
         f"📁 <b>Name:</b> {new_file.name}\n"
         f"📂 <b>Category:</b> {current_category.name}\n"
         f"🆔 <b>ID:</b> <code>{new_file.unique_id}</code>\n\n"
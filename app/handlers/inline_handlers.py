@@ -0,0 +1,109 @@
+from aiogram import Router, html
+from aiogram.types import (
+    InlineQuery,
+    InlineQueryResultCachedAudio,
+    InlineQueryResultCachedDocument,
+    InlineQueryResultCachedPhoto,
+    InlineQueryResultCachedVideo,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from decouple import config
+
+from app.cache import TTLCache
+from app.metrics import register_cache
+from app.services.user_service import get_or_create_user
+from app.services.file_service import FileRow, get_user_files_page, encode_file_cursor
+from app.services.search_service import search_user_files, encode_search_cursor
+import logging
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+INLINE_CACHE_TIME = config("INLINE_CACHE_TIME", default=30, cast=int)
+INLINE_PAGE_SIZE = 20
+
+# Results per (user, normalized query, offset), so keystroke bursts share one query
+_results_cache = TTLCache(maxsize=2048, ttl=INLINE_CACHE_TIME)
+register_cache("inline_results", _results_cache)
+
+
+@router.inline_query(flags={"read_only": True})
+async def inline_files_handler(inline_query: InlineQuery, session: AsyncSession):
+    """Offer the user's stored files as inline results, searched by name"""
+    query = " ".join(inline_query.query.lower().split())
+    cache_key = (inline_query.from_user.id, query, inline_query.offset)
+
+    cached = _results_cache.get(cache_key)
+    if cached is None:
+        cached = await _build_results(session, inline_query, query)
+        _results_cache.set(cache_key, cached)
+
+    results, next_offset = cached
+    await inline_query.answer(
+        results,
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=True,
+        next_offset=next_offset,
+    )
+
+
+async def _build_results(
+    session: AsyncSession, inline_query: InlineQuery, query: str
+) -> tuple[list, str]:
+    db_user = await get_or_create_user(session, inline_query.from_user)
+    cursor = inline_query.offset or None
+
+    try:
+        if len(query) >= 2:
+            rows, has_more = await search_user_files(
+                session, db_user.id, query, cursor=cursor, limit=INLINE_PAGE_SIZE
+            )
+            next_offset = encode_search_cursor(*rows[-1]) if has_more else ""
+            files = [file for file, _ in rows]
+        else:
+            files, has_more = await get_user_files_page(
+                session, db_user.id, cursor=cursor, limit=INLINE_PAGE_SIZE
+            )
+            next_offset = encode_file_cursor(files[-1]) if has_more else ""
+    except ValueError:
+        logger.warning(f"Ignoring malformed inline offset: {inline_query.offset}")
+        return [], ""
+
+    return [inline_result(file) for file in files], next_offset
+
+
+def inline_result(file: FileRow):
+    """Build the cached inline result matching how the file was uploaded.
+
+    Telegram rejects the whole answer if a result's type does not match its
+    file id, so anything not known to be a photo, video or audio is offered
+    as a document.
+    """
+    caption = f"📁 <b>{html.quote(file.name)}</b>\n\nID: <code>{file.unique_id}</code>"
+
+    if file.kind == "photo":
+        return InlineQueryResultCachedPhoto(
+            id=file.unique_id,
+            photo_file_id=file.telegram_file_id,
+            title=file.name,
+            caption=caption,
+        )
+    if file.kind == "video":
+        return InlineQueryResultCachedVideo(
+            id=file.unique_id,
+            video_file_id=file.telegram_file_id,
+            title=file.name,
+            caption=caption,
+        )
+    if file.kind == "audio":
+        return InlineQueryResultCachedAudio(
+            id=file.unique_id,
+            audio_file_id=file.telegram_file_id,
+            caption=caption,
+        )
+    return InlineQueryResultCachedDocument(
+        id=file.unique_id,
+        document_file_id=file.telegram_file_id,
+        title=file.name,
+        caption=caption,
+    )
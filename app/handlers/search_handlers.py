@@ -0,0 +1,144 @@
+import hashlib
+
+from aiogram import Router, F
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery, Message
+from aiogram.filters import Command, CommandObject
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.user_service import get_or_create_user
+from app.services.search_service import (
+    search_user_files,
+    encode_search_cursor,
+    decode_search_cursor,
+)
+from app.keyboards import (
+    back_to_menu_keyboard,
+    files_pagination_keyboard,
+    search_results_text,
+)
+import logging
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+# Queries remembered per user, so older result messages can still page
+SEARCH_QUERIES_KEPT = 20
+
+
+@router.message(Command("search"), flags={"read_only": True})
+async def search_command(
+    message: Message, command: CommandObject, session: AsyncSession, state: FSMContext
+):
+    """Handle /search <text> command"""
+    query = (command.args or "").strip()
+    if len(query) < 2:
+        await message.answer(
+            "📝 <b>Usage:</b> /search &lt;text&gt;\n\n"
+            "Example: <code>/search invoice</code>\n\n"
+            "Type at least 2 characters of the file name."
+        )
+        return
+
+    logger.info(f"User {message.from_user.id} searched for: {query}")
+
+    query_key = await remember_query(state, query)
+    text, keyboard = await render_search_page(
+        session, message.from_user, query, query_key, page=1
+    )
+    await message.answer(text, reply_markup=keyboard)
+
+
+@router.callback_query(F.data.startswith("search_page_"), flags={"read_only": True})
+async def search_page_handler(
+    callback: CallbackQuery, session: AsyncSession, state: FSMContext
+):
+    """Handle search pagination buttons"""
+    try:
+        page, direction, cursor, query_key = callback.data.replace(
+            "search_page_", "", 1
+        ).split("_", 3)
+        page = int(page)
+        decode_search_cursor(cursor)
+    except ValueError:
+        await callback.answer("Invalid page number.", show_alert=True)
+        return
+
+    query = (await state.get_data()).get("search_queries", {}).get(query_key)
+    if query is None:
+        await callback.answer(
+            "This search has expired. Please run /search again.", show_alert=True
+        )
+        return
+
+    text, keyboard = await render_search_page(
+        session,
+        callback.from_user,
+        query,
+        query_key,
+        page=page,
+        cursor=cursor,
+        backward=direction == "p",
+    )
+    await callback.message.edit_text(text, reply_markup=keyboard)
+    await callback.answer()
+
+
+async def remember_query(state: FSMContext, query: str) -> str:
+    """Keep a query in the user's FSM data and return the short key for buttons.
+
+    Callback data is limited to 64 bytes, too little for the query itself.
+    """
+    query_key = hashlib.blake2b(query.encode(), digest_size=6).hexdigest()
+    queries = (await state.get_data()).get("search_queries", {})
+    queries.pop(query_key, None)
+    queries[query_key] = query
+    while len(queries) > SEARCH_QUERIES_KEPT:
+        queries.pop(next(iter(queries)))
+    await state.update_data(search_queries=queries)
+    return query_key
+
+
+async def render_search_page(
+    session: AsyncSession,
+    telegram_user,
+    query: str,
+    query_key: str,
+    page: int,
+    cursor: str | None = None,
+    backward: bool = False,
+    limit: int = 10,
+):
+    """Build the text and keyboard for one page of search results"""
+    db_user = await get_or_create_user(session, telegram_user)
+
+    rows, has_more = await search_user_files(
+        session, db_user.id, query, cursor=cursor, limit=limit, backward=backward
+    )
+
+    if not rows:
+        return (
+            "🔎 Nothing found. Try a different part of the file name.",
+            back_to_menu_keyboard(),
+        )
+
+    has_next = True if backward else has_more
+    has_previous = has_more if backward else page > 1
+
+    prev_data = next_data = None
+    if has_previous:
+        prev_data = (
+            f"search_page_{page - 1}_p_{encode_search_cursor(*rows[0])}_{query_key}"
+        )
+    if has_next:
+        next_data = (
+            f"search_page_{page + 1}_n_{encode_search_cursor(*rows[-1])}_{query_key}"
+        )
+
+    files = [file for file, _ in rows]
+    offset = (page - 1) * limit
+    text = search_results_text(files, query, page, offset)
+    keyboard = files_pagination_keyboard(
+        files, page, offset, prev_data=prev_data, next_data=next_data
+    )
+    return text, keyboard
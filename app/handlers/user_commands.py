@@ -13,10 +13,10 @@ router = Router()
 @router.message(CommandStart())
 async def command_start_handler(message: Message, session: AsyncSession):
     """Handle /start command"""
-    db_user = await get_or_create_user(session, message.from_user)
+    await get_or_create_user(session, message.from_user)
 
     welcome_text = (
-        f"👋 Hello {hbold(db_user.first_name)}!\n\n"
+        f"👋 Hello {hbold(message.from_user.first_name)}!\n\n"
         f"Welcome to your personal file library. What would you like to do?"
     )
     await message.answer(welcome_text, reply_markup=main_menu_keyboard())
@@ -36,6 +36,7 @@ async def command_help_handler(message: Message):
         "• Just send me any file (document, photo, etc.) to save it\n"
         "• Use 'My Files' to see your uploaded files\n"
         "• Click 'Download' to get any file back instantly\n"
+        "• Use /search &lt;text&gt; to find a file by name\n"
         "• I use Telegram's secure storage - your files are safe!"
     )
     await message.answer(help_text)
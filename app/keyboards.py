@@ -1,6 +1,12 @@
+from typing import Sequence
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram import html
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from app.services.category_service import CategoryRef
+from app.services.file_service import FileRow
+
 
 def main_menu_keyboard() -> InlineKeyboardMarkup:
     """Create the main inline menu"""
@@ -25,7 +31,13 @@ def back_to_menu_keyboard() -> InlineKeyboardMarkup:
     )
 
 
-def files_pagination_keyboard(files, current_page: int, total_pages: int, offset: int):
+def files_pagination_keyboard(
+    files: Sequence[FileRow],
+    current_page: int,
+    offset: int,
+    prev_data: str | None = None,
+    next_data: str | None = None,
+):
     """Create keyboard for files list with pagination"""
     builder = InlineKeyboardBuilder()
 
@@ -43,18 +55,14 @@ def files_pagination_keyboard(files, current_page: int, total_pages: int, offset
 
     pagination_buttons = []
 
-    if current_page > 1:
+    if prev_data:
         pagination_buttons.append(
-            InlineKeyboardButton(
-                text="⬅️ Previous", callback_data=f"files_page_{current_page - 1}"
-            )
+            InlineKeyboardButton(text="⬅️ Previous", callback_data=prev_data)
         )
 
-    if current_page < total_pages:
+    if next_data:
         pagination_buttons.append(
-            InlineKeyboardButton(
-                text="Next ➡️", callback_data=f"files_page_{current_page + 1}"
-            )
+            InlineKeyboardButton(text="Next ➡️", callback_data=next_data)
         )
 
     if pagination_buttons:
@@ -66,7 +74,7 @@ def files_pagination_keyboard(files, current_page: int, total_pages: int, offset
 
 
 def files_list_keyboard(
-    files, page: int, total_pages: int, total_files: int, offset: int
+    files: Sequence[FileRow], page: int, total_pages: int, total_files: int, offset: int
 ):
     """Create the complete files list message with pagination info"""
     file_list = ""
@@ -87,6 +95,25 @@ def files_list_keyboard(
     return message_text
 
 
+def search_results_text(files: Sequence[FileRow], query: str, page: int, offset: int):
+    """Create the search results message"""
+    file_list = ""
+    for i, file in enumerate(files, 1):
+        display_number = offset + i
+        file_list += (
+            f"{display_number}. {file.name} (ID: <code>{file.unique_id}</code>)\n"
+        )
+
+    message_text = (
+        f"🔎 <b>Results for</b> <code>{html.quote(query)}</code> (Page {page})\n\n"
+        f"{file_list}\n"
+        f"🔹 <b>Click a file to download it</b>\n"
+        f"🔹 Or use: <code>/get file_id</code>"
+    )
+
+    return message_text
+
+
 def category_management_keyboard():
     """Keyboard for category management"""
     builder = InlineKeyboardBuilder()
@@ -112,7 +139,9 @@ def category_management_keyboard():
     return builder.as_markup()
 
 
-def categories_list_keyboard(categories, current_category_id: None | int = None):
+def categories_list_keyboard(
+    categories: Sequence[CategoryRef], current_category_id: None | int = None
+):
     """Keyboard for listing categories"""
     builder = InlineKeyboardBuilder()
 
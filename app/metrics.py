@@ -0,0 +1,399 @@
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+from decouple import config
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+
+from app.cache import TTLCache
+
+METRICS_ENABLED = config("METRICS_ENABLED", default=False, cast=bool)
+METRICS_HOST = config("METRICS_HOST", default="127.0.0.1")
+METRICS_PORT = config("METRICS_PORT", default=9090, cast=int)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+logger = logging.getLogger(__name__)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, Any] = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for key, value in sorted(self._values.items()):
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: tuple, value: Any) -> list[str]:
+        return [f"{self.name}{self._format_labels(key)} {value}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing value"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observations over cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self._values.get(key)
+        if counts is None:
+            # One slot per bucket plus +Inf, then the running sum
+            counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def _render_value(self, key: tuple, counts: list) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), counts):
+            cumulative += count
+            labels = self._format_labels(key, f'le="{bound}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {counts[-1]}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+class _CacheCollector(_Metric):
+    """Exposes hit/miss counters and sizes of registered in-process caches"""
+
+    def __init__(self):
+        super().__init__("bot_cache", "In-process cache statistics", ("cache",))
+        self.caches: dict[str, TTLCache] = {}
+
+    def render(self) -> list[str]:
+        lines = []
+        for suffix, kind, field in (
+            ("hits_total", "counter", "hits"),
+            ("misses_total", "counter", "misses"),
+            ("entries", "gauge", "size"),
+        ):
+            name = f"{self.name}_{suffix}"
+            lines += [
+                f"# HELP {name} {self.documentation}",
+                f"# TYPE {name} {kind}",
+            ]
+            for cache_name, cache in sorted(self.caches.items()):
+                value = cache.stats()[field]
+                lines.append(f'{name}{{cache="{cache_name}"}} {value}')
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+updates_in_flight = Gauge("bot_updates_in_flight", "Updates currently being processed")
+update_seconds = Histogram(
+    "bot_update_seconds", "Time to process an update", ("event_type",)
+)
+handler_seconds = Histogram(
+    "bot_handler_seconds", "Time spent in a handler", ("handler",)
+)
+handler_errors = Counter(
+    "bot_handler_errors_total", "Handlers that raised", ("handler",)
+)
+sql_seconds = Histogram("bot_sql_seconds", "Time to execute one SQL statement")
+sql_statements_per_update = Histogram(
+    "bot_sql_statements_per_update",
+    "SQL statements executed per update",
+    buckets=COUNT_BUCKETS,
+)
+sql_seconds_per_update = Histogram(
+    "bot_sql_seconds_per_update", "Total SQL time per update"
+)
+pool_checkout_seconds = Histogram(
+    "bot_db_pool_checkout_seconds", "Time waiting for a pooled connection"
+)
+pool_checked_out = Gauge(
+    "bot_db_pool_checked_out", "Connections currently checked out of the pool"
+)
+api_seconds = Histogram(
+    "bot_api_request_seconds", "Latency of outbound Bot API calls", ("method",)
+)
+api_errors = Counter(
+    "bot_api_errors_total", "Failed outbound Bot API calls", ("method", "error")
+)
+outbound_queue_depth = Gauge(
+    "bot_outbound_queue_depth", "Outbound calls waiting for a send slot", ("lane",)
+)
+outbound_wait_seconds = Histogram(
+    "bot_outbound_wait_seconds", "Time an outbound call waited to be sent", ("lane",)
+)
+outbound_retries = Counter(
+    "bot_outbound_retries_total", "Outbound calls retried after a 429", ("method",)
+)
+throttled_updates = Counter(
+    "bot_throttled_updates_total", "Updates dropped by per-user throttling", ("kind",)
+)
+
+caches = _CacheCollector()
+
+
+def register_cache(name: str, cache: TTLCache):
+    """Include a cache's statistics in the metrics output"""
+    caches.caches[name] = cache
+
+
+class UpdateStats:
+    """SQL work attributed to the update being processed"""
+
+    __slots__ = ("statements", "sql_time")
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_time = 0.0
+
+
+current_update_stats: ContextVar[UpdateStats | None] = ContextVar(
+    "current_update_stats", default=None
+)
+
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Update middleware recording latency, in-flight count and SQL work per update"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        stats = UpdateStats()
+        token = current_update_stats.set(stats)
+        updates_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            event_type = event.event_type if isinstance(event, Update) else "unknown"
+            update_seconds.observe(time.perf_counter() - started, event_type=event_type)
+            sql_statements_per_update.observe(stats.statements)
+            sql_seconds_per_update.observe(stats.sql_time)
+            updates_in_flight.dec()
+            current_update_stats.reset(token)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Event middleware recording latency and errors per handler function"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        name = handler_name(data)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(handler=name)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - started, handler=name)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Bot session middleware recording outbound API call latency and errors"""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            api_errors.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            api_seconds.observe(time.perf_counter() - started, method=name)
+
+
+def handler_name(data: Dict[str, Any]) -> str:
+    """Name of the handler function aiogram resolved for this event"""
+    handler = data.get("handler")
+    callback = getattr(handler, "callback", None)
+    return getattr(callback, "__qualname__", "unknown")
+
+
+_instrumented_engines: set[int] = set()
+
+
+def instrument_engine(engine: AsyncEngine):
+    """Attach SQL timing and pool checkout hooks to an engine, once.
+
+    Checkout waits are measured for ORM sessions, from the execute or flush
+    that needed a connection to the transaction beginning on it.
+    """
+    if id(engine) in _instrumented_engines:
+        return
+    _instrumented_engines.add(id(engine))
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        sql_seconds.observe(elapsed)
+        stats = current_update_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.sql_time += elapsed
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        # A failed statement never reaches after_cursor_execute
+        if context.connection is not None:
+            started = context.connection.info.get("query_started")
+            if started:
+                started.pop()
+
+    @event.listens_for(sync_engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_checked_out.inc()
+
+    @event.listens_for(sync_engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        pool_checked_out.dec()
+
+    if not event.contains(Session, "after_begin", _connection_acquired):
+        event.listen(Session, "do_orm_execute", _statement_started)
+        event.listen(Session, "before_flush", _flush_started)
+        event.listen(Session, "after_begin", _connection_acquired)
+
+
+# The pool has no "before checkout" event. A session asks for a connection
+# only from an execute or a flush, so time from the latest of those to the
+# transaction beginning on the connection it was handed.
+def _statement_started(state):
+    state.session.info["connection_wanted"] = time.perf_counter()
+
+
+def _flush_started(session, flush_context, instances):
+    session.info["connection_wanted"] = time.perf_counter()
+
+
+def _connection_acquired(session, transaction, connection):
+    started = session.info.pop("connection_wanted", None)
+    if started is not None:
+        pool_checkout_seconds.observe(time.perf_counter() - started)
+
+
+def create_metrics_app(engine: AsyncEngine) -> web.Application:
+    """aiohttp application exposing /metrics, /healthz and /readyz"""
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(
+            text=render_metrics(), content_type="text/plain", charset="utf-8"
+        )
+
+    async def healthz(request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    async def readyz(request: web.Request) -> web.Response:
+        try:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+        except Exception as e:
+            logger.warning(f"Readiness check failed: {e}")
+            return web.Response(status=503, text="database unavailable")
+        return web.Response(text="ready")
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/readyz", readyz)
+    return app
+
+
+class MetricsServer:
+    """Local HTTP endpoint started and stopped with the dispatcher"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self._runner: web.AppRunner | None = None
+
+    async def start(self, worker_index: int = 0, **kwargs):
+        self._runner = web.AppRunner(create_metrics_app(self.engine))
+        await self._runner.setup()
+        port = METRICS_PORT + worker_index
+        await web.TCPSite(self._runner, METRICS_HOST, port).start()
+        logger.info(f"Metrics available on http://{METRICS_HOST}:{port}/metrics")
+
+    async def stop(self, **kwargs):
+        if self._runner:
+            await self._runner.cleanup()
@@ -1,11 +1,51 @@
 from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
-from aiogram.types import TelegramObject
-from .database import get_db_session
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import TelegramObject, Update
+from decouple import config
+from .cache import TTLCache
+from .database import LazySession, current_session, use_replica
+from .metrics import throttled_updates
+from .ratelimit import TokenBucket
+
+THROTTLE_ENABLED = config("THROTTLE_ENABLED", default=True, cast=bool)
+
+# (tokens per second, burst) per kind of update; uploads allow a full album
+THROTTLE_LIMITS = {
+    "callback": (
+        config("THROTTLE_CALLBACK_RATE", default=2.0, cast=float),
+        config("THROTTLE_CALLBACK_BURST", default=6, cast=int),
+    ),
+    "upload": (
+        config("THROTTLE_UPLOAD_RATE", default=1.0, cast=float),
+        config("THROTTLE_UPLOAD_BURST", default=20, cast=int),
+    ),
+    "command": (
+        config("THROTTLE_COMMAND_RATE", default=1.0, cast=float),
+        config("THROTTLE_COMMAND_BURST", default=5, cast=int),
+    ),
+    "message": (
+        config("THROTTLE_MESSAGE_RATE", default=1.0, cast=float),
+        config("THROTTLE_MESSAGE_BURST", default=5, cast=int),
+    ),
+    "inline": (
+        config("THROTTLE_INLINE_RATE", default=3.0, cast=float),
+        config("THROTTLE_INLINE_BURST", default=10, cast=int),
+    ),
+}
 
 
 class DbSessionMiddleware(BaseMiddleware):
-    """Middleware to inject database session into handler data"""
+    """Event middleware running each handler as one unit of work.
+
+    Handlers get a lazily opened session. Services only flush; the session
+    is committed once after the handler returns and rolled back if it
+    raises. Handlers flagged ``read_only`` skip the commit unless they
+    wrote something after all, and read from a replica unless the user
+    wrote recently. The session is exposed as ``current_session`` so the
+    send scheduler can close it while still write-free before a handler
+    waits to send.
+    """
 
     async def __call__(
         self,
@@ -13,6 +53,90 @@ class DbSessionMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any],
     ) -> Any:
-        async for session in get_db_session():
-            data["session"] = session
+        user = data.get("event_from_user")
+        user_id = user.id if user else None
+        read_only = get_flag(data, "read_only", default=False)
+        session = LazySession(
+            info={"user_id": user_id, "replica": read_only and use_replica(user_id)}
+        )
+        data["session"] = session
+        token = current_session.set(session)
+        try:
+            result = await handler(event, data)
+            if session.is_opened and (session.has_writes or not read_only):
+                await session.commit()
+            return result
+        finally:
+            current_session.reset(token)
+            # Rolls back whatever was not committed
+            await session.close()
+
+
+class _UserBucket(TokenBucket):
+    __slots__ = ("warned",)
+
+    def __init__(self, rate: float, capacity: float):
+        super().__init__(rate, capacity)
+        self.warned = False
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Update middleware dropping updates from users who exceed their rate.
+
+    Each user gets a token bucket per kind of update. Buckets live in an
+    LRU that forgets users once they have been idle long enough for their
+    bucket to refill. Rejected callbacks are answered so the button stops
+    spinning; a rejected message gets one notice per burst. Nothing reaches
+    the database middleware.
+    """
+
+    def __init__(self, limits: dict[str, tuple[float, int]] = THROTTLE_LIMITS):
+        self.limits = limits
+        idle = max(burst / rate for rate, burst in limits.values())
+        self._buckets = TTLCache(maxsize=100_000, ttl=idle)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        kind = update_kind(event)
+        if user is None or kind not in self.limits:
             return await handler(event, data)
+
+        key = (user.id, kind)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = _UserBucket(*self.limits[kind])
+        self._buckets.set(key, bucket)
+
+        if bucket.try_take():
+            bucket.warned = False
+            return await handler(event, data)
+
+        throttled_updates.inc(kind=kind)
+        if event.callback_query:
+            await event.callback_query.answer("⏳ Too fast, please slow down.")
+        elif event.message and not bucket.warned:
+            bucket.warned = True
+            await event.message.answer("⏳ Too many requests, please wait a moment.")
+
+
+def update_kind(event: TelegramObject) -> str | None:
+    """Throttling class of an update"""
+    if not isinstance(event, Update):
+        return None
+    if event.callback_query:
+        return "callback"
+    if event.inline_query:
+        return "inline"
+    message = event.message
+    if message is None:
+        return None
+    if message.document or message.photo or message.video or message.audio:
+        return "upload"
+    if message.text and message.text.startswith("/"):
+        return "command"
+    return "message"
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, BigInteger, DateTime, func, ForeignKey
+from sqlalchemy import Integer, String, BigInteger, DateTime, func, ForeignKey, Index
 from .database import Base
 from typing import Optional
 
@@ -57,8 +57,13 @@ class File(Base):
     )
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     mime_type: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    # How the file was sent: document, photo, video or audio
+    kind: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
     size: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     telegram_file_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    telegram_file_unique_id: Mapped[Optional[str]] = mapped_column(
+        String(64), nullable=True
+    )
     file_path: Mapped[str] = mapped_column(String(500), default="telegram_storage")
 
     user_id: Mapped[int] = mapped_column(
@@ -83,3 +88,69 @@ class File(Base):
 
     def __repr__(self):
         return f"<File(id={self.id}, name='{self.name}', user_id={self.user_id})>"
+
+
+class UserStats(Base):
+    """Per-user storage counters, maintained by triggers on ``files``"""
+
+    __tablename__ = "user_stats"
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    file_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    total_bytes: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, server_default="0"
+    )
+    last_upload_at: Mapped[Optional[DateTime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+    def __repr__(self):
+        return f"<UserStats(user_id={self.user_id}, file_count={self.file_count})>"
+
+
+class UserCategoryStats(Base):
+    """Per-user, per-category storage counters, maintained by triggers on ``files``"""
+
+    __tablename__ = "user_category_stats"
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    category_id: Mapped[int] = mapped_column(
+        ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True
+    )
+    file_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    total_bytes: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, server_default="0"
+    )
+    last_upload_at: Mapped[Optional[DateTime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+    def __repr__(self):
+        return (
+            f"<UserCategoryStats(user_id={self.user_id}, "
+            f"category_id={self.category_id}, file_count={self.file_count})>"
+        )
+
+
+Index(
+    "ix_files_user_id_created_at_id",
+    File.user_id,
+    File.created_at.desc(),
+    File.id.desc(),
+)
+
+Index(
+    "ix_files_name_trgm",
+    File.name,
+    postgresql_using="gin",
+    postgresql_ops={"name": "gin_trgm_ops"},
+)
+
+Index(
+    "ix_files_user_id_telegram_file_unique_id",
+    File.user_id,
+    File.telegram_file_unique_id,
+    unique=True,
+)
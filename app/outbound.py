@@ -0,0 +1,159 @@
+import asyncio
+import heapq
+import logging
+import time
+from itertools import count
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    AnswerCallbackQuery,
+    AnswerInlineQuery,
+    CopyMessage,
+    ForwardMessage,
+    SendAudio,
+    SendDocument,
+    SendMediaGroup,
+    SendPhoto,
+    SendVideo,
+)
+from decouple import config
+
+from app.cache import TTLCache
+from app.database import release_current_session
+from app.ratelimit import TokenBucket
+from app.metrics import outbound_queue_depth, outbound_retries, outbound_wait_seconds
+
+OUTBOUND_SCHEDULER = config("OUTBOUND_SCHEDULER", default=True, cast=bool)
+OUTBOUND_GLOBAL_RATE = config("OUTBOUND_GLOBAL_RATE", default=30.0, cast=float)
+OUTBOUND_CHAT_RATE = config("OUTBOUND_CHAT_RATE", default=1.0, cast=float)
+OUTBOUND_CHAT_BURST = config("OUTBOUND_CHAT_BURST", default=3, cast=int)
+OUTBOUND_GROUP_RATE = config("OUTBOUND_GROUP_RATE", default=20 / 60, cast=float)
+OUTBOUND_MAX_RETRIES = config("OUTBOUND_MAX_RETRIES", default=3, cast=int)
+
+# Lanes in priority order; lower values are sent first
+INTERACTIVE, REPLY, BULK = 0, 1, 2
+LANE_NAMES = ("interactive", "reply", "bulk")
+
+_INTERACTIVE_METHODS = (AnswerCallbackQuery, AnswerInlineQuery)
+_BULK_METHODS = (
+    SendDocument,
+    SendPhoto,
+    SendVideo,
+    SendAudio,
+    SendMediaGroup,
+    CopyMessage,
+    ForwardMessage,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """Bot session middleware that paces outbound calls within Telegram's limits.
+
+    Calls addressed to a chat first wait for that chat's token bucket, then
+    every scheduled call waits its turn for the global bucket. When the
+    global bucket runs dry, waiting calls are released by lane: callback
+    and inline answers before replies, replies before file sends. A 429
+    pauses the affected bucket for ``retry_after`` and the call is retried.
+    Methods with no chat and no lane, such as getUpdates, are not paced.
+
+    A handler about to wait first closes its database session if it has
+    not written anything, so paced reads do not hold pooled connections.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = OUTBOUND_GLOBAL_RATE,
+        chat_rate: float = OUTBOUND_CHAT_RATE,
+        chat_burst: int = OUTBOUND_CHAT_BURST,
+        group_rate: float = OUTBOUND_GROUP_RATE,
+        max_retries: int = OUTBOUND_MAX_RETRIES,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        # An idle bucket refills within a minute, so expiring it loses nothing
+        self._chat_buckets = TTLCache(maxsize=100_000, ttl=60)
+        self._waiting: list[tuple[int, int, asyncio.Future]] = []
+        self._order = count()
+        self._pump: asyncio.Task | None = None
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        lane = self._lane(method)
+        if lane is None:
+            return await make_request(bot, method)
+
+        for attempt in range(self.max_retries + 1):
+            await self._wait_turn(lane, chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                name = type(method).__name__
+                outbound_retries.inc(method=name)
+                logger.warning(
+                    f"{name} to {chat_id} hit a flood limit, retrying in {e.retry_after}s"
+                )
+                if chat_id is not None:
+                    self._chat_bucket(chat_id).pause(e.retry_after)
+                else:
+                    self.global_bucket.pause(e.retry_after)
+
+    @staticmethod
+    def _lane(method) -> int | None:
+        if isinstance(method, _INTERACTIVE_METHODS):
+            return INTERACTIVE
+        if isinstance(method, _BULK_METHODS):
+            return BULK
+        if getattr(method, "chat_id", None) is not None:
+            return REPLY
+        return None
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Negative ids are groups and channels, which have a much lower limit
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            else:
+                bucket = TokenBucket(self.group_rate, 1)
+        # Re-set on every use so a busy chat's bucket never expires
+        self._chat_buckets.set(chat_id, bucket)
+        return bucket
+
+    async def _wait_turn(self, lane: int, chat_id):
+        lane_name = LANE_NAMES[lane]
+        started = time.perf_counter()
+        outbound_queue_depth.inc(lane=lane_name)
+        try:
+            if chat_id is not None:
+                delay = self._chat_bucket(chat_id).reserve()
+                if delay > 0:
+                    await release_current_session()
+                    await asyncio.sleep(delay)
+
+            if self._waiting or not self.global_bucket.try_take():
+                await release_current_session()
+                turn = asyncio.get_running_loop().create_future()
+                heapq.heappush(self._waiting, (lane, next(self._order), turn))
+                if self._pump is None or self._pump.done():
+                    self._pump = asyncio.create_task(self._release_in_order())
+                await turn
+        finally:
+            outbound_queue_depth.dec(lane=lane_name)
+            outbound_wait_seconds.observe(time.perf_counter() - started, lane=lane_name)
+
+    async def _release_in_order(self):
+        while self._waiting:
+            _, _, turn = heapq.heappop(self._waiting)
+            if turn.done():
+                continue
+            await asyncio.sleep(self.global_bucket.reserve())
+            if not turn.done():
+                turn.set_result(None)
@@ -0,0 +1,242 @@
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from types import FrameType
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from decouple import config
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.metrics import handler_name
+
+PROFILER_ENABLED = config("PROFILER_ENABLED", default=False, cast=bool)
+PROFILER_THRESHOLD = config("PROFILER_THRESHOLD", default=1.0, cast=float)
+PROFILER_SAMPLE_RATE = config("PROFILER_SAMPLE_RATE", default=0.0, cast=float)
+PROFILER_DIR = config("PROFILER_DIR", default="profiles")
+PROFILER_MAX_FILES = config("PROFILER_MAX_FILES", default=200, cast=int)
+PROFILER_STACK_INTERVAL = config("PROFILER_STACK_INTERVAL", default=0.005, cast=float)
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateProfile:
+    """Everything captured while one update was being processed"""
+
+    __slots__ = ("task", "handler", "queries", "stacks", "_query_started")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.handler = "unknown"
+        self.queries: list[tuple[str, float]] = []
+        self.stacks: Counter[str] = Counter()
+        self._query_started: float | None = None
+
+
+current_profile: ContextVar[UpdateProfile | None] = ContextVar(
+    "current_profile", default=None
+)
+
+
+class SlowUpdateProfiler(BaseMiddleware):
+    """Update middleware that writes a profile for slow or sampled updates.
+
+    Every update gets cheap coroutine stack samples and a log of its SQL
+    statements; they are written out only when the update exceeds the
+    threshold. Sampled updates additionally run under cProfile when no
+    other update is being profiled, as cProfile is process-wide.
+    """
+
+    def __init__(
+        self,
+        directory: str = PROFILER_DIR,
+        threshold: float = PROFILER_THRESHOLD,
+        sample_rate: float = PROFILER_SAMPLE_RATE,
+        max_files: int = PROFILER_MAX_FILES,
+        stack_interval: float = PROFILER_STACK_INTERVAL,
+    ):
+        self.directory = Path(directory)
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.stack_interval = stack_interval
+        self._active: set[UpdateProfile] = set()
+        self._sampler: asyncio.Task | None = None
+        self._cprofile_busy = False
+        self._writes: set[asyncio.Task] = set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        profile = UpdateProfile(asyncio.current_task())
+        token = current_profile.set(profile)
+        self._active.add(profile)
+        if self._sampler is None or self._sampler.done():
+            self._sampler = asyncio.create_task(self._sample_stacks())
+
+        sampled = random.random() < self.sample_rate and not self._cprofile_busy
+        profiler = None
+        if sampled:
+            self._cprofile_busy = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = time.perf_counter() - started
+            if profiler is not None:
+                profiler.disable()
+                self._cprofile_busy = False
+            self._active.discard(profile)
+            current_profile.reset(token)
+
+            if sampled or elapsed >= self.threshold:
+                report = self._report(event, profile, elapsed, profiler)
+                write = asyncio.create_task(
+                    asyncio.to_thread(self._write, profile, elapsed, report)
+                )
+                self._writes.add(write)
+                write.add_done_callback(self._writes.discard)
+
+    async def _sample_stacks(self):
+        while self._active:
+            for profile in tuple(self._active):
+                frames = coroutine_stack(profile.task.get_coro())
+                if frames:
+                    profile.stacks[
+                        " <- ".join(
+                            f"{frame.f_code.co_qualname} "
+                            f"({Path(frame.f_code.co_filename).name}:{frame.f_lineno})"
+                            for frame in reversed(frames)
+                        )
+                    ] += 1
+            await asyncio.sleep(self.stack_interval)
+
+    def _report(
+        self,
+        event: TelegramObject,
+        profile: UpdateProfile,
+        elapsed: float,
+        profiler: cProfile.Profile | None,
+    ) -> str:
+        lines = [
+            f"handler: {profile.handler}",
+            f"update: {describe_update(event)}",
+            f"elapsed: {elapsed * 1000:.1f} ms",
+            f"sql: {len(profile.queries)} statements, "
+            f"{sum(d for _, d in profile.queries) * 1000:.1f} ms",
+            "",
+            "== SQL statements ==",
+        ]
+        for statement, duration in profile.queries:
+            lines.append(f"{duration * 1000:8.1f} ms  {' '.join(statement.split())}")
+
+        lines += ["", f"== Awaiting stacks (every {self.stack_interval * 1000:g} ms) =="]
+        for stack, count in profile.stacks.most_common(20):
+            lines.append(f"{count:6d}  {stack}")
+
+        if profiler is not None:
+            output = io.StringIO()
+            stats = pstats.Stats(profiler, stream=output)
+            stats.sort_stats("cumulative").print_stats(40)
+            lines += [
+                "",
+                "== cProfile (process-wide, may include other updates) ==",
+                output.getvalue(),
+            ]
+        return "\n".join(lines) + "\n"
+
+    def _write(self, profile: UpdateProfile, elapsed: float, report: str):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = self.directory / f"{stamp}-{profile.handler}-{elapsed * 1000:.0f}ms.txt"
+        path.write_text(report, encoding="utf-8")
+        logger.warning(f"Slow update in {profile.handler} ({elapsed:.2f}s): {path}")
+
+        profiles = sorted(self.directory.glob("*.txt"))
+        for old in profiles[: max(0, len(profiles) - self.max_files)]:
+            old.unlink(missing_ok=True)
+
+
+class ProfileHandlerMiddleware(BaseMiddleware):
+    """Event middleware that tags the current profile with the handler name"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        profile = current_profile.get()
+        if profile is not None:
+            profile.handler = handler_name(data)
+        return await handler(event, data)
+
+
+def coroutine_stack(coro) -> list[FrameType]:
+    """Frames of a suspended coroutine and everything it awaits, outermost first.
+
+    Task.get_stack() only reports the task's own coroutine frame while it is
+    suspended, so follow the await chain down to the innermost frame.
+    """
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return frames
+
+
+def describe_update(event: TelegramObject) -> str:
+    """Short description of an update: its type plus callback data or message text"""
+    if not isinstance(event, Update):
+        return type(event).__name__
+    if event.callback_query:
+        return f"callback_query data={event.callback_query.data!r}"
+    if event.message:
+        content = event.message.text or event.message.content_type
+        return f"message {content!r}"
+    if event.inline_query:
+        return f"inline_query {event.inline_query.query!r}"
+    return event.event_type
+
+
+_profiled_engines: set[int] = set()
+
+
+def profile_engine(engine: AsyncEngine):
+    """Record SQL statements and their timings into the current update's profile"""
+    if id(engine) in _profiled_engines:
+        return
+    _profiled_engines.add(id(engine))
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = current_profile.get()
+        if profile is not None:
+            profile._query_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = current_profile.get()
+        if profile is not None and profile._query_started is not None:
+            profile.queries.append((statement, time.perf_counter() - profile._query_started))
+            profile._query_started = None
@@ -1,20 +1,56 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
-from typing import Optional
-from app.models import Category, User
+from typing import NamedTuple, Optional
+from app.cache import TTLCache
+from app.database import after_commit
+from app.metrics import register_cache
+from app.models import Category, User, UserCategoryStats
+from app.services.user_service import update_cached_current_category
 
 
-async def get_user_categories(session: AsyncSession, user_id: int) -> list[Category]:
-    """Get all categories that have files belonging to a user"""
+class CategoryRef(NamedTuple):
+    """Cached view of a category shown in the user's category list"""
+
+    id: int
+    name: str
+
+
+_user_categories_cache = TTLCache(maxsize=4096, ttl=600)
+register_cache("user_categories", _user_categories_cache)
+
+
+async def get_user_categories(session: AsyncSession, user_id: int) -> list[CategoryRef]:
+    """Get all categories that have files belonging to a user.
+
+    Reads the (user_id, category_id) keyed stats table, so the cost depends
+    on the number of categories rather than files, and caches the result.
+    """
+    categories = _user_categories_cache.get(user_id)
+    if categories is not None:
+        return categories
+
     result = await session.execute(
-        select(Category)
-        .join(Category.files)
-        .where(Category.files.any(user_id=user_id))
-        .distinct()
+        select(Category.id, Category.name)
+        .join(UserCategoryStats, UserCategoryStats.category_id == Category.id)
+        .where(UserCategoryStats.user_id == user_id, UserCategoryStats.file_count > 0)
         .order_by(Category.name)
     )
-    return result.scalars().all()
+    categories = [CategoryRef(*row) for row in result.all()]
+    _user_categories_cache.set(user_id, categories)
+    return categories
+
+
+def note_user_category_used(user_id: int, category_id: int):
+    """Invalidate the cached category list if a file landed in a category not in it"""
+    categories = _user_categories_cache.get(user_id)
+    if categories is not None and all(c.id != category_id for c in categories):
+        _user_categories_cache.pop(user_id)
+
+
+def forget_user_categories(user_id: int):
+    """Drop the cached category list, e.g. after files left one of its categories"""
+    _user_categories_cache.pop(user_id)
 
 
 async def get_or_create_category(
@@ -29,8 +65,8 @@ async def get_or_create_category(
     if not category:
         category = Category(name=category_name)
         session.add(category)
-        await session.commit()
-        await session.refresh(category)
+        await session.flush()
+        after_commit(session, lambda: _user_categories_cache.pop(user_id))
 
     return category
 
@@ -39,10 +75,16 @@ async def set_user_current_category(
     session: AsyncSession, user_id: int, category_id: Optional[int]
 ):
     """Set user's current category for uploads"""
-    result = await session.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one()
-    user.current_category_id = category_id
-    await session.commit()
+    result = await session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(current_category_id=category_id)
+        .returning(User.telegram_id)
+    )
+    telegram_id = result.scalar_one()
+    after_commit(
+        session, lambda: update_cached_current_category(telegram_id, category_id)
+    )
 
 
 async def get_user_current_category(
@@ -61,8 +103,12 @@ async def get_user_current_category(
     if not user.current_category:
         general_category = await get_general_category(session)
         user.current_category_id = general_category.id
-        await session.commit()
-        await session.refresh(user)
+        after_commit(
+            session,
+            lambda: update_cached_current_category(
+                user.telegram_id, general_category.id
+            ),
+        )
         return general_category
 
     return user.current_category
@@ -0,0 +1,48 @@
+from typing import NamedTuple, Optional
+from decouple import config
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.cache import TTLCache
+from app.metrics import register_cache
+from app.models import File, User
+
+DOWNLOAD_CACHE_SIZE = config("DOWNLOAD_CACHE_SIZE", default=10_000, cast=int)
+DOWNLOAD_CACHE_TTL = config("DOWNLOAD_CACHE_TTL", default=300, cast=float)
+
+
+class Download(NamedTuple):
+    """What is needed to send a stored file back, including who may receive it"""
+
+    unique_id: str
+    name: str
+    telegram_file_id: str
+    owner_telegram_id: int
+
+
+# Stored files never change these fields. The cache is per process, so if
+# files ever become removable, other webhook workers would keep serving a
+# removed file for up to DOWNLOAD_CACHE_TTL seconds.
+_downloads_cache = TTLCache(maxsize=DOWNLOAD_CACHE_SIZE, ttl=DOWNLOAD_CACHE_TTL)
+register_cache("downloads", _downloads_cache)
+
+
+async def get_download(session: AsyncSession, unique_id: str) -> Optional[Download]:
+    """Resolve a file id to its download details with one join, cached"""
+    download = _downloads_cache.get(unique_id)
+    if download is not None:
+        return download
+
+    result = await session.execute(
+        select(File.unique_id, File.name, File.telegram_file_id, User.telegram_id)
+        .join(User, User.id == File.user_id)
+        .where(File.unique_id == unique_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        # Not cached: write-behind uploads become visible a moment later
+        return None
+
+    download = Download(*row)
+    _downloads_cache.set(unique_id, download)
+    return download
+
@@ -0,0 +1,89 @@
+import asyncio
+import secrets
+import string
+
+from decouple import config
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Random bits appended to every id so neighbouring ids cannot be guessed
+FILE_ID_TAG_BITS = config("FILE_ID_TAG_BITS", default=16, cast=int)
+
+# Must match the INCREMENT BY of files_unique_id_seq
+FILE_ID_BLOCK = 64
+
+# In ASCII order, so ids of equal length compare byte-wise like the numbers
+# they encode. Postgres only orders them that way under "C" collation; the
+# files.unique_id index uses the database default, so nothing relies on it.
+ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase
+_LEGACY_CHARS = set(string.hexdigits.lower())
+
+
+def to_base62(value: int) -> str:
+    digits = ""
+    while True:
+        value, remainder = divmod(value, 62)
+        digits = ALPHABET[remainder] + digits
+        if not value:
+            return digits
+
+
+def from_base62(file_id: str) -> int:
+    value = 0
+    for char in file_id:
+        value = value * 62 + ALPHABET.index(char)
+    return value
+
+
+def _looks_legacy(file_id: str) -> bool:
+    """Whether an id could clash with the 8 hex character ids issued before"""
+    return len(file_id) == 8 and set(file_id) <= _LEGACY_CHARS
+
+
+class SequenceFileIds:
+    """Short file ids built from a Postgres sequence.
+
+    Each id is the base62 encoding of a sequence value followed by
+    ``tag_bits`` random bits, so ids are unique without retries. Values
+    are reserved in blocks of FILE_ID_BLOCK, so the sequence is hit once
+    per block per process. Values whose id would look like a legacy id
+    are skipped.
+    """
+
+    def __init__(
+        self, sequence: str = "files_unique_id_seq", tag_bits: int = FILE_ID_TAG_BITS
+    ):
+        self.sequence = sequence
+        self.tag_bits = tag_bits
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def allocate(self, session: AsyncSession, count: int) -> list[str]:
+        """Return ``count`` new file ids"""
+        ids = []
+        async with self._lock:
+            while len(ids) < count:
+                if self._next == self._end:
+                    await self._reserve_block(session)
+                file_id = self.encode(self._next)
+                self._next += 1
+                if not _looks_legacy(file_id):
+                    ids.append(file_id)
+        return ids
+
+    def encode(self, value: int) -> str:
+        return to_base62(value << self.tag_bits | secrets.randbits(self.tag_bits))
+
+    def decode(self, file_id: str) -> int:
+        """Sequence value an id was built from"""
+        return from_base62(file_id) >> self.tag_bits
+
+    async def _reserve_block(self, session: AsyncSession):
+        result = await session.execute(text(f"SELECT nextval('{self.sequence}')"))
+        self._next = result.scalar_one()
+        self._end = self._next + FILE_ID_BLOCK
+
+
+# Anything with an ``allocate(session, count)`` coroutine can replace this
+file_ids = SequenceFileIds()
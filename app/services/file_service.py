@@ -1,7 +1,102 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from itertools import count
+from typing import NamedTuple, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.models import File, Category
-import uuid
+from sqlalchemy import (
+    BigInteger,
+    Integer,
+    String,
+    column,
+    exists,
+    func,
+    literal,
+    literal_column,
+    select,
+    true,
+    tuple_,
+    union_all,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import aliased
+from app.cache import TTLCache
+from app.database import after_commit
+from app.metrics import register_cache
+from app.services.category_service import (
+    CategoryRef,
+    get_user_current_category,
+    forget_user_categories,
+    note_user_category_used,
+)
+from app.services.file_ids import file_ids
+from app.services.ingest_journal import journal
+from app.services.user_service import get_or_create_user
+from app.models import File, Category, User, UserStats
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class FileRow(NamedTuple):
+    """Untracked view of a file with just what list screens and inline results show"""
+
+    id: int
+    unique_id: str
+    name: str
+    mime_type: Optional[str]
+    kind: Optional[str]
+    telegram_file_id: str
+    created_at: datetime
+
+
+FILE_ROW_COLUMNS = (
+    File.id,
+    File.unique_id,
+    File.name,
+    File.mime_type,
+    File.kind,
+    File.telegram_file_id,
+    File.created_at,
+)
+
+# Approximate per-user file totals shown on the "My Files" screen
+_files_count_cache = TTLCache(maxsize=4096, ttl=300)
+register_cache("files_count", _files_count_cache)
+
+# Set whenever a user's files change, so cached renders of them go stale.
+# Versions come from one counter and are never reused, and entries outlive
+# any cached render, so a user whose entry expired can safely read as 0.
+_library_versions = TTLCache(maxsize=100_000, ttl=600)
+_next_library_version = count(1)
+
+
+def library_version(user_id: int) -> int:
+    """Current version of a user's file library"""
+    return _library_versions.get(user_id, 0)
+
+
+def _library_changed(user_id: int):
+    _files_count_cache.pop(user_id)
+    _library_versions.set(user_id, next(_next_library_version))
+
+
+def _files_stored(
+    session: AsyncSession, user_id: int, category_id: int, moved: bool = False
+):
+    """Invalidate caches for the user's library once the new files are committed.
+
+    Files moved from another category may have emptied it, so then the whole
+    category list is dropped rather than only checked for the new category.
+    """
+
+    def invalidate():
+        _library_changed(user_id)
+        if moved:
+            forget_user_categories(user_id)
+        else:
+            note_user_category_used(user_id, category_id)
+
+    after_commit(session, invalidate)
 
 
 async def get_general_category(session: AsyncSession) -> Category:
@@ -12,50 +107,355 @@ async def get_general_category(session: AsyncSession) -> Category:
     if not category:
         category = Category(name="General")
         session.add(category)
-        await session.commit()
+        await session.flush()
 
     return category
 
 
-async def create_file_record(
-    session: AsyncSession, file_data: dict, user_id: int, category_id: int
-) -> File:
-    """Create a new file record in database with category"""
-    new_file = File(
-        unique_id=str(uuid.uuid4())[:8],
+def _new_file_row(
+    file_data: dict, unique_id: str, user_id: int, category_id: int
+) -> dict:
+    return {
+        "unique_id": unique_id,
         **file_data,
-        user_id=user_id,
-        category_id=category_id,
+        "user_id": user_id,
+        "category_id": category_id,
+    }
+
+
+def _distinct_content(files_data: list[dict]) -> list[dict]:
+    """Keep the first of each file, as Telegram repeats content within an album"""
+    unique, seen = [], set()
+    for file_data in files_data:
+        if file_data["telegram_file_unique_id"] not in seen:
+            seen.add(file_data["telegram_file_unique_id"])
+            unique.append(file_data)
+    return unique
+
+
+async def create_file_records(
+    session: AsyncSession, files_data: list[dict], user_id: int, category_id: int
+) -> list[tuple[File, bool]]:
+    """Create several file records with a single multi-row upsert ... RETURNING"""
+    unique = _distinct_content(files_data)
+    unique_ids = await file_ids.allocate(session, len(unique))
+    rows = [
+        _new_file_row(file_data, unique_id, user_id, category_id)
+        for file_data, unique_id in zip(unique, unique_ids)
+    ]
+
+    if journal is not None:
+        return await _journal_file_rows(session, rows, user_id)
+
+    # xmax is 0 only for rows this statement inserted rather than updated
+    stmt = pg_insert(File).returning(
+        File, literal_column("xmax = 0"), sort_by_parameter_order=True
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[File.user_id, File.telegram_file_unique_id],
+        set_={"category_id": stmt.excluded.category_id, "updated_at": func.now()},
     )
-    session.add(new_file)
-    await session.commit()
-    await session.refresh(new_file)
-    return new_file
+    result = await session.execute(
+        stmt, rows, execution_options={"populate_existing": True}
+    )
+    saved = [(file, created) for file, created in result.all()]
+    moved = not all(created for _, created in saved)
+    _files_stored(session, user_id, category_id, moved)
+    return saved
+
+
+async def ingest_files(
+    session: AsyncSession, telegram_user, files_data: list[dict]
+) -> tuple[list[tuple[File, bool]], CategoryRef]:
+    """Store files uploaded by a Telegram user, resolving everything in one statement.
+
+    A single INSERT ... SELECT with CTEs finds or creates the user, picks
+    their current category (falling back to General, created if missing)
+    and upserts the files, returning them along with that category. The
+    caller's commit is the only other round trip.
+    """
+    if journal is not None:
+        db_user = await get_or_create_user(session, telegram_user)
+        category = await get_user_current_category(session, db_user.id)
+        saved = await create_file_records(session, files_data, db_user.id, category.id)
+        return saved, CategoryRef(category.id, category.name)
+
+    files_data = _distinct_content(files_data)
+    unique_ids = await file_ids.allocate(session, len(files_data))
+    stmt = _ingest_statement(telegram_user, files_data, unique_ids)
+
+    # A new user's first uploads racing each other can miss the user row once
+    for _ in range(2):
+        result = await session.execute(
+            stmt, execution_options={"populate_existing": True}
+        )
+        rows = result.all()
+        if rows:
+            break
+    else:
+        raise RuntimeError(f"Could not store files for user {telegram_user.id}")
+    # The statement is a SELECT, but its CTEs write
+    session.info["has_writes"] = True
+
+    by_content = {
+        file.telegram_file_unique_id: (file, created) for file, created, *_ in rows
+    }
+    saved = [by_content[data["telegram_file_unique_id"]] for data in files_data]
+    category = CategoryRef(rows[0].category_id, rows[0].category_name)
+    moved = not all(created for _, created in saved)
+    _files_stored(session, saved[0][0].user_id, category.id, moved)
+    return saved, category
+
+
+async def ingest_file(
+    session: AsyncSession, telegram_user, file_data: dict
+) -> tuple[File, bool, CategoryRef]:
+    """Store one uploaded file; see ingest_files"""
+    saved, category = await ingest_files(session, telegram_user, [file_data])
+    return (*saved[0], category)
+
+
+def _ingest_statement(telegram_user, files_data: list[dict], unique_ids: list[str]):
+    telegram_id = literal(telegram_user.id, BigInteger)
+
+    new_user = (
+        pg_insert(User)
+        .from_select(
+            ["telegram_id", "username", "first_name", "last_name"],
+            select(
+                telegram_id,
+                literal(telegram_user.username, String),
+                literal(telegram_user.first_name, String),
+                literal(telegram_user.last_name, String),
+            ).where(~exists().where(User.telegram_id == telegram_id)),
+        )
+        .on_conflict_do_nothing()
+        .returning(User.id, User.current_category_id)
+        .cte("new_user")
+    )
+    user = union_all(
+        select(new_user.c.id, new_user.c.current_category_id),
+        select(User.id, User.current_category_id).where(User.telegram_id == telegram_id),
+    ).cte("upload_user")
+
+    new_general = (
+        pg_insert(Category)
+        .from_select(
+            ["name"],
+            select(literal("General", String)).where(
+                ~exists().where(Category.name == "General")
+            ),
+        )
+        .on_conflict_do_nothing()
+        .returning(Category.id, Category.name)
+        .cte("new_general")
+    )
+    category = (
+        union_all(
+            select(Category.id, Category.name, literal(0).label("rank"))
+            .select_from(user)
+            .join(Category, Category.id == user.c.current_category_id),
+            select(new_general.c.id, new_general.c.name, literal(1)),
+            select(Category.id, Category.name, literal(2)).where(
+                Category.name == "General"
+            ),
+        )
+        .order_by("rank")
+        .limit(1)
+        .cte("upload_category")
+    )
+
+    fields = (
+        "name",
+        "mime_type",
+        "kind",
+        "size",
+        "telegram_file_id",
+        "telegram_file_unique_id",
+    )
+    uploads = values(
+        column("unique_id", String),
+        column("name", String),
+        column("mime_type", String),
+        column("kind", String),
+        column("size", Integer),
+        column("telegram_file_id", String),
+        column("telegram_file_unique_id", String),
+        name="uploads",
+    ).data(
+        [
+            (unique_id, *(file_data.get(field) for field in fields))
+            for file_data, unique_id in zip(files_data, unique_ids)
+        ]
+    )
+
+    # Python-side column defaults are not applied to INSERT ... FROM SELECT
+    insert_files = pg_insert(File).from_select(
+        ["unique_id", *fields, "file_path", "user_id", "category_id"],
+        select(uploads, literal("telegram_storage", String), user.c.id, category.c.id)
+        .select_from(uploads)
+        .join(user, true())
+        .join(category, true()),
+    )
+    saved = (
+        insert_files.on_conflict_do_update(
+            index_elements=[File.user_id, File.telegram_file_unique_id],
+            set_={
+                "category_id": insert_files.excluded.category_id,
+                "updated_at": func.now(),
+            },
+        )
+        .returning(*File.__table__.c, literal_column("xmax = 0").label("created"))
+        .cte("saved")
+    )
+
+    saved_file = aliased(File, saved)
+    return (
+        select(
+            saved_file,
+            saved.c.created,
+            category.c.id.label("category_id"),
+            category.c.name.label("category_name"),
+        )
+        .select_from(saved_file)
+        .join(category, true())
+    )
+
+
+async def insert_file_rows(session: AsyncSession, rows: list[dict]):
+    """Insert journaled file rows in one statement, skipping ones already stored"""
+    await session.execute(pg_insert(File).values(rows).on_conflict_do_nothing())
+    for user_id, category_id in {(row["user_id"], row["category_id"]) for row in rows}:
+        _files_stored(session, user_id, category_id)
+
+
+async def _journal_file_rows(
+    session: AsyncSession, rows: list[dict], user_id: int
+) -> list[tuple[File, bool]]:
+    """Acknowledge file rows from the write-behind journal as transient File objects.
+
+    Content the user already stored is looked up first and moved directly,
+    so its existing id is returned instead of one that the flush would drop.
+    Content still waiting in this process's journal returns its pending id.
+    """
+    result = await session.execute(
+        select(File).where(
+            File.user_id == user_id,
+            File.telegram_file_unique_id.in_(
+                [row["telegram_file_unique_id"] for row in rows]
+            ),
+        )
+    )
+    existing = {file.telegram_file_unique_id: file for file in result.scalars()}
+    for file in existing.values():
+        file.category_id = rows[0]["category_id"]
+    if existing:
+        _files_stored(session, user_id, rows[0]["category_id"], moved=True)
+
+    # No await between checking and appending, so concurrent duplicates
+    # of the same content always find each other
+    saved = {key: (file, False) for key, file in existing.items()}
+    new_rows = []
+    now = datetime.now(timezone.utc)
+    for row in rows:
+        key = row["telegram_file_unique_id"]
+        journaled = None if key in saved else journal.pending(user_id, key)
+        if journaled is not None:
+            saved[key] = (File(**journaled), False)
+        elif key not in saved:
+            new_rows.append({**row, "created_at": now})
+    await asyncio.gather(*(journal.append(row) for row in new_rows))
+
+    for row in new_rows:
+        saved[row["telegram_file_unique_id"]] = (File(**row), True)
+    return [saved[row["telegram_file_unique_id"]] for row in rows]
 
 
 async def get_user_files(
     session: AsyncSession, user_id: int, offset: int = 0, limit: int = 10
-):
+) -> list[FileRow]:
     """Get user's files with pagination"""
-    from sqlalchemy import select
-    from app.models import File
-
     result = await session.execute(
-        select(File)
+        select(*FILE_ROW_COLUMNS)
         .where(File.user_id == user_id)
-        .order_by(File.created_at.desc())
+        .order_by(File.created_at.desc(), File.id.desc())
         .offset(offset)
         .limit(limit)
     )
-    return result.scalars().all()
+    return [FileRow(*row) for row in result.all()]
 
 
-async def get_user_files_count(session: AsyncSession, user_id: int) -> int:
-    """Get total number of files for a user"""
-    from sqlalchemy import select, func
-    from app.models import File
+def encode_file_cursor(file: FileRow) -> str:
+    """Encode a file's (created_at, id) position as a compact cursor string"""
+    micros = (file.created_at - _EPOCH) // timedelta(microseconds=1)
+    return f"{_to_base36(micros)}-{_to_base36(file.id)}"
+
+
+def decode_file_cursor(cursor: str) -> tuple[datetime, int]:
+    """Decode a cursor produced by encode_file_cursor, raising ValueError if malformed"""
+    micros, file_id = (int(part, 36) for part in cursor.split("-"))
+    return _EPOCH + timedelta(microseconds=micros), file_id
+
+
+async def get_user_files_page(
+    session: AsyncSession,
+    user_id: int,
+    cursor: str | None = None,
+    limit: int = 10,
+    backward: bool = False,
+) -> tuple[list[FileRow], bool]:
+    """Get a page of user's files before (older) or after (newer) a cursor.
+
+    Uses the (user_id, created_at, id) index so the cost does not grow with
+    the page number. Without a cursor the newest files are returned. Returns
+    the files newest first and whether more files exist beyond this page in
+    the direction of travel.
+    """
+    position = tuple_(File.created_at, File.id)
+    query = select(*FILE_ROW_COLUMNS).where(File.user_id == user_id)
+
+    if backward:
+        if cursor:
+            query = query.where(position > decode_file_cursor(cursor))
+        query = query.order_by(File.created_at.asc(), File.id.asc())
+    else:
+        if cursor:
+            query = query.where(position < decode_file_cursor(cursor))
+        query = query.order_by(File.created_at.desc(), File.id.desc())
 
+    result = await session.execute(query.limit(limit + 1))
+    files = [FileRow(*row) for row in result.all()]
+    has_more = len(files) > limit
+    files = files[:limit]
+
+    if backward:
+        files.reverse()
+
+    return files, has_more
+
+
+async def get_user_files_count(session: AsyncSession, user_id: int) -> int:
+    """Get total number of files for a user from the maintained stats row"""
     result = await session.execute(
-        select(func.count(File.id)).where(File.user_id == user_id)
+        select(UserStats.file_count).where(UserStats.user_id == user_id)
     )
     return result.scalar() or 0
+
+
+async def get_user_files_count_cached(session: AsyncSession, user_id: int) -> int:
+    """Get an approximate number of files for a user, counting at most once per TTL"""
+    total = _files_count_cache.get(user_id)
+    if total is None:
+        total = await get_user_files_count(session, user_id)
+        _files_count_cache.set(user_id, total)
+    return total
+
+
+def _to_base36(value: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    encoded = ""
+    while True:
+        value, remainder = divmod(value, 36)
+        encoded = digits[remainder] + encoded
+        if value == 0:
+            return encoded
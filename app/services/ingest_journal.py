@@ -0,0 +1,261 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+from decouple import config
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from app.database import async_session
+
+INGEST_WRITE_BEHIND = config("INGEST_WRITE_BEHIND", default=False, cast=bool)
+INGEST_JOURNAL_DIR = config("INGEST_JOURNAL_DIR", default="ingest_journal")
+INGEST_FSYNC_DELAY = config("INGEST_FSYNC_DELAY", default=0.005, cast=float)
+INGEST_FLUSH_INTERVAL = config("INGEST_FLUSH_INTERVAL", default=1.0, cast=float)
+INGEST_FLUSH_BATCH = config("INGEST_FLUSH_BATCH", default=500, cast=int)
+INGEST_FLUSH_ATTEMPTS = config("INGEST_FLUSH_ATTEMPTS", default=5, cast=int)
+
+logger = logging.getLogger(__name__)
+
+
+class IngestJournal:
+    """Append-only local journal that acknowledges file records before they hit Postgres.
+
+    Appends are made durable with one fsync per batch of concurrent writers.
+    A background task periodically seals the active journal into a segment,
+    inserts its records with multi-row inserts and deletes it. Segments left
+    behind by a crash are replayed on start; inserts ignore unique_id
+    conflicts so a replay never duplicates rows.
+
+    Each webhook worker appends to its own active file and holds an flock on
+    it. Workers share the segments: flushing them is serialized by a lock
+    file, and the active file of a worker that has exited is sealed by
+    whichever worker flushes next. A segment that keeps failing for reasons
+    other than a lost connection is renamed to ``failed-*.jsonl`` after
+    ``flush_attempts`` tries, so it cannot block the segments after it.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        fsync_delay: float = 0.005,
+        flush_interval: float = 1.0,
+        flush_batch: int = 500,
+        flush_attempts: int = 5,
+    ):
+        self.directory = Path(directory)
+        self.fsync_delay = fsync_delay
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.flush_attempts = flush_attempts
+        self._worker = 0
+        self._file = None
+        self._flush_lock_file = None
+        self._lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._waiters: list[asyncio.Future] = []
+        self._sync_handle: asyncio.TimerHandle | None = None
+        self._flusher: asyncio.Task | None = None
+        self._failures: dict[str, int] = {}
+        self._pending: dict[tuple, dict] = {}
+
+    @property
+    def _active_path(self) -> Path:
+        return self.directory / f"active-{self._worker}.jsonl"
+
+    async def start(self, worker_index: int = 0, **kwargs):
+        """Open the journal, replay anything left unflushed and start the flusher"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._worker = worker_index
+        self._flush_lock_file = open(self.directory / "flush.lock", "a")
+        self._file = self._open_active()
+        await self.flush()
+        self._flusher = asyncio.create_task(self._flush_forever())
+
+    async def stop(self, **kwargs):
+        """Stop the flusher and drain the journal into the database"""
+        if self._flusher:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+        self._file.close()
+        self._flush_lock_file.close()
+
+    def append(self, row: dict) -> asyncio.Future:
+        """Record a file row; the returned future resolves once it is fsync'd.
+
+        The row counts as pending from this call on, so a duplicate upload
+        arriving before the fsync already finds it.
+        """
+        self._file.write(json.dumps(row, default=_encode) + "\n")
+        self._pending[_pending_key(row)] = row
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+
+        if self._sync_handle is None:
+            self._sync_handle = asyncio.get_running_loop().call_later(
+                self.fsync_delay, lambda: asyncio.ensure_future(self._sync())
+            )
+        return waiter
+
+    def pending(self, user_id: int, telegram_file_unique_id: str) -> dict | None:
+        """Row journaled by this process for the content and not yet flushed"""
+        return self._pending.get((user_id, telegram_file_unique_id))
+
+    def _forget_pending(self, rows: list[dict]):
+        for row in rows:
+            key = _pending_key(row)
+            if self._pending.get(key, {}).get("unique_id") == row.get("unique_id"):
+                del self._pending[key]
+
+    async def flush(self):
+        """Seal the active journal and insert every pending segment"""
+        async with self._lock:
+            await self._seal()
+
+        async with self._flush_lock:
+            fd = self._flush_lock_file.fileno()
+            await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+            try:
+                self._seal_abandoned()
+                for segment in sorted(self.directory.glob("segment-*.jsonl")):
+                    if not await self._flush_segment(segment):
+                        break
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    async def _flush_segment(self, segment: Path) -> bool:
+        """Insert and delete one segment; False if the database is unreachable"""
+        rows = []
+        try:
+            with open(segment, encoding="utf-8") as f:
+                rows = [json.loads(line, object_hook=_decode) for line in f if line.strip()]
+            for start in range(0, len(rows), self.flush_batch):
+                await self._insert(rows[start : start + self.flush_batch])
+        except Exception as e:
+            if _is_transient(e):
+                logger.error(f"Failed to flush {segment.name}, will retry: {e}")
+                return False
+
+            attempts = self._failures.pop(segment.name, 0) + 1
+            if attempts < self.flush_attempts:
+                self._failures[segment.name] = attempts
+                logger.error(f"Failed to flush {segment.name} ({attempts} attempts): {e}")
+            else:
+                failed = segment.with_name(segment.name.replace("segment-", "failed-", 1))
+                segment.rename(failed)
+                self._forget_pending(rows)
+                logger.error(f"Quarantined {failed.name} after {attempts} attempts: {e}")
+            return True
+
+        segment.unlink()
+        self._forget_pending(rows)
+        self._failures.pop(segment.name, None)
+        if rows:
+            logger.info(f"Flushed {len(rows)} journaled file records")
+        return True
+
+    async def _sync(self):
+        async with self._lock:
+            self._sync_handle = None
+            waiters, self._waiters = self._waiters, []
+            if not waiters:
+                return
+            self._file.flush()
+            await asyncio.to_thread(os.fsync, self._file.fileno())
+
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _seal(self):
+        self._file.flush()
+        sealed, waiters, self._waiters = self._file, self._waiters, []
+        if sealed.tell():
+            # Rows appended while the fsync runs go to the fresh active file
+            self._active_path.rename(self._segment_path())
+            self._file = self._open_active()
+
+        await asyncio.to_thread(os.fsync, sealed.fileno())
+        if sealed is not self._file:
+            sealed.close()
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _seal_abandoned(self):
+        """Turn the active files of workers that have exited into segments"""
+        for path in self.directory.glob("active*.jsonl"):
+            if path == self._active_path:
+                continue
+            with open(path, "a", encoding="utf-8") as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                # Skip files that are empty or were just sealed by their owner
+                if f.tell() and os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                    path.rename(self._segment_path())
+
+    def _open_active(self):
+        f = open(self._active_path, "a", encoding="utf-8")
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return f
+
+    def _segment_path(self) -> Path:
+        return self.directory / f"segment-{time.time_ns():020d}-{self._worker}.jsonl"
+
+    async def _insert(self, rows: list[dict]):
+        from app.services.file_service import insert_file_rows
+
+        async with async_session() as session:
+            await insert_file_rows(session, rows)
+            await session.commit()
+
+    async def _flush_forever(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush ingest journal: {e}")
+
+
+def _pending_key(row: dict) -> tuple:
+    return row.get("user_id"), row.get("telegram_file_unique_id")
+
+
+def _is_transient(error: Exception) -> bool:
+    """Whether a flush failed because the database could not be reached"""
+    if isinstance(error, (OperationalError, InterfaceError, OSError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Cannot journal {type(value).__name__}")
+
+
+def _decode(obj: dict):
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+journal = (
+    IngestJournal(
+        INGEST_JOURNAL_DIR,
+        fsync_delay=INGEST_FSYNC_DELAY,
+        flush_interval=INGEST_FLUSH_INTERVAL,
+        flush_batch=INGEST_FLUSH_BATCH,
+        flush_attempts=INGEST_FLUSH_ATTEMPTS,
+    )
+    if INGEST_WRITE_BEHIND
+    else None
+)
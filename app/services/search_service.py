@@ -0,0 +1,67 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Integer, cast, func, or_, select, tuple_
+from app.models import File
+from app.services.file_service import (
+    FILE_ROW_COLUMNS,
+    FileRow,
+    decode_file_cursor,
+    encode_file_cursor,
+)
+
+
+def _score(query: str):
+    """Similarity of the query to a file name, scaled to an integer for stable cursors"""
+    return cast(func.word_similarity(query, File.name) * 1000, Integer)
+
+
+def encode_search_cursor(file: FileRow, score: int) -> str:
+    """Encode a result's (score, created_at, id) position as a cursor string"""
+    return f"{score}-{encode_file_cursor(file)}"
+
+
+def decode_search_cursor(cursor: str) -> tuple[int, object, int]:
+    """Decode a cursor produced by encode_search_cursor, raising ValueError if malformed"""
+    score, file_cursor = cursor.split("-", 1)
+    return (int(score), *decode_file_cursor(file_cursor))
+
+
+async def search_user_files(
+    session: AsyncSession,
+    user_id: int,
+    query: str,
+    cursor: str | None = None,
+    limit: int = 10,
+    backward: bool = False,
+) -> tuple[list[tuple[FileRow, int]], bool]:
+    """Search a user's files by name, best matches first, then newest first.
+
+    Candidates come from the trigram GIN index on ``files.name`` (substring
+    and word-similarity matches). Returns (file, score) pairs and whether
+    more results exist beyond this page in the direction of travel.
+    """
+    score = _score(query).label("score")
+    pattern = query.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    stmt = select(*FILE_ROW_COLUMNS, score).where(
+        File.user_id == user_id,
+        or_(File.name.ilike(f"%{pattern}%", escape="!"), File.name.op("%>")(query)),
+    )
+
+    position = tuple_(_score(query), File.created_at, File.id)
+    if backward:
+        if cursor:
+            stmt = stmt.where(position > decode_search_cursor(cursor))
+        stmt = stmt.order_by(score.asc(), File.created_at.asc(), File.id.asc())
+    else:
+        if cursor:
+            stmt = stmt.where(position < decode_search_cursor(cursor))
+        stmt = stmt.order_by(score.desc(), File.created_at.desc(), File.id.desc())
+
+    result = await session.execute(stmt.limit(limit + 1))
+    rows = [(FileRow(*row[:-1]), row[-1]) for row in result.all()]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if backward:
+        rows.reverse()
+
+    return rows, has_more
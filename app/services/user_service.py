@@ -1,32 +1,72 @@
+from typing import NamedTuple, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.models import User
-from sqlalchemy.orm import selectinload
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from app.cache import TTLCache
+from app.database import after_commit
+from app.metrics import register_cache
+from app.models import User, UserStats
 
-async def get_or_create_user(session: AsyncSession, telegram_user) -> User:
-    """Get user from DB or create if not exists"""
-    result = await session.execute(
-        select(User)
-        .where(User.telegram_id == telegram_user.id)
-        .options(selectinload(User.files))
+
+class UserRef(NamedTuple):
+    """Identity of a stored user, cheap enough to cache per telegram_id"""
+
+    id: int
+    current_category_id: Optional[int]
+
+
+_user_cache = TTLCache(maxsize=10_000, ttl=600)
+register_cache("users", _user_cache)
+
+
+async def get_or_create_user(session: AsyncSession, telegram_user) -> UserRef:
+    """Get user from DB or create if not exists.
+
+    Served from an in-process cache when possible; otherwise a single
+    upsert both creates the user and refreshes their profile fields.
+    """
+    cached = _user_cache.get(telegram_user.id)
+    if cached is not None:
+        return cached
+
+    stmt = insert(User).values(
+        telegram_id=telegram_user.id,
+        username=telegram_user.username,
+        first_name=telegram_user.first_name,
+        last_name=telegram_user.last_name,
     )
-    db_user = result.scalar_one_or_none()
-
-    if db_user is None:
-        db_user = User(
-            telegram_id=telegram_user.id,
-            username=telegram_user.username,
-            first_name=telegram_user.first_name,
-            last_name=telegram_user.last_name,
-        )
-        session.add(db_user)
-        await session.commit()
-        await session.refresh(db_user)
-        result = await session.execute(
-            select(User)
-            .where(User.telegram_id == telegram_user.id)
-            .options(selectinload(User.files))
-        )
-        db_user = result.scalar_one_or_none()
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={
+            "username": stmt.excluded.username,
+            "first_name": stmt.excluded.first_name,
+            "last_name": stmt.excluded.last_name,
+            "updated_at": func.now(),
+        },
+    ).returning(User.id, User.current_category_id)
+
+    result = await session.execute(stmt)
+    db_user = UserRef(*result.one())
 
+    after_commit(session, lambda: _user_cache.set(telegram_user.id, db_user))
     return db_user
+
+
+def update_cached_current_category(telegram_id: int, category_id: Optional[int]):
+    """Keep the cached identity in sync after the user's current category changes"""
+    cached = _user_cache.get(telegram_id)
+    if cached is not None:
+        _user_cache.set(telegram_id, cached._replace(current_category_id=category_id))
+
+
+async def get_user_with_stats(
+    session: AsyncSession, telegram_id: int
+) -> tuple[Optional[User], Optional[UserStats]]:
+    """Get a user together with their storage counters in one query"""
+    result = await session.execute(
+        select(User, UserStats)
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+        .where(User.telegram_id == telegram_id)
+    )
+    row = result.one_or_none()
+    return (row[0], row[1]) if row else (None, None)
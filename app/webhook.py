@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import multiprocessing
+from typing import Any, Dict
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from decouple import config
+
+from app.fsm_storage import FSM_STORAGE
+
+WEBHOOK_BASE_URL = config("WEBHOOK_BASE_URL", default="")
+WEBHOOK_PATH = config("WEBHOOK_PATH", default="/webhook")
+WEBHOOK_SECRET = config("WEBHOOK_SECRET", default="") or None
+WEBHOOK_HOST = config("WEBHOOK_HOST", default="0.0.0.0")
+WEBHOOK_PORT = config("WEBHOOK_PORT", default=8080, cast=int)
+WEBHOOK_WORKERS = config("WEBHOOK_WORKERS", default=1, cast=int)
+WEBHOOK_MAX_CONNECTIONS = config("WEBHOOK_MAX_CONNECTIONS", default=40, cast=int)
+WEBHOOK_IN_BACKGROUND = config("WEBHOOK_IN_BACKGROUND", default=True, cast=bool)
+
+FILE_FIELDS = ("document", "photo", "video", "audio")
+
+logger = logging.getLogger(__name__)
+
+
+class LimitedRequestHandler(SimpleRequestHandler):
+    """Webhook request handler that caps how many updates are processed at once"""
+
+    def __init__(
+        self, dispatcher: Dispatcher, bot: Bot, concurrency_limit: int, **kwargs: Any
+    ):
+        super().__init__(dispatcher=dispatcher, bot=bot, **kwargs)
+        self._semaphore = asyncio.Semaphore(concurrency_limit)
+
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        async with self._semaphore:
+            await super()._background_feed_update(bot, update)
+
+    async def _handle_request(self, bot: Bot, request: web.Request) -> web.Response:
+        async with self._semaphore:
+            return await super()._handle_request(bot, request)
+
+    async def _handle_request_background(
+        self, bot: Bot, request: web.Request
+    ) -> web.Response:
+        # Telegram does not redeliver an update once it got a 200, so an upload
+        # acknowledged before it is stored would be lost if the worker dies.
+        # File-carrying messages are answered only after they are handled.
+        update = await request.json(loads=bot.session.json_loads)
+        if _carries_file(update):
+            return await self._handle_request(bot, request)
+        return await super()._handle_request_background(bot, request)
+
+
+def _carries_file(update: Dict[str, Any]) -> bool:
+    message = update.get("message") or {}
+    return any(field in message for field in FILE_FIELDS)
+
+
+def create_webhook_app(
+    bot: Bot,
+    dp: Dispatcher,
+    concurrency_limit: int,
+    register_webhook: bool,
+    worker_index: int = 0,
+) -> web.Application:
+    """Create the aiohttp application serving Telegram updates for the dispatcher"""
+    app = web.Application()
+
+    LimitedRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        concurrency_limit=concurrency_limit,
+        handle_in_background=WEBHOOK_IN_BACKGROUND,
+        secret_token=WEBHOOK_SECRET,
+    ).register(app, path=WEBHOOK_PATH)
+
+    if register_webhook:
+
+        async def on_startup(bot: Bot, **kwargs: Any):
+            await bot.set_webhook(
+                f"{WEBHOOK_BASE_URL}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logger.info(f"Webhook registered at {WEBHOOK_BASE_URL}{WEBHOOK_PATH}")
+
+        dp.startup.register(on_startup)
+
+    setup_application(app, dp, bot=bot, worker_index=worker_index)
+    return app
+
+
+async def serve_webhook(
+    bot: Bot,
+    dp: Dispatcher,
+    concurrency_limit: int,
+    register_webhook: bool = True,
+    worker_index: int = 0,
+):
+    """Serve the webhook endpoint until cancelled"""
+    app = create_webhook_app(
+        bot, dp, concurrency_limit, register_webhook, worker_index
+    )
+    runner = web.AppRunner(app)
+    await runner.setup()
+
+    site = web.TCPSite(
+        runner, WEBHOOK_HOST, WEBHOOK_PORT, reuse_port=WEBHOOK_WORKERS > 1
+    )
+    await site.start()
+    logger.info(f"Listening for webhook updates on {WEBHOOK_HOST}:{WEBHOOK_PORT}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def start_webhook(bot: Bot, dp: Dispatcher, concurrency_limit: int):
+    """Run the webhook server, forking extra workers that share the listening port.
+
+    Only this process registers the webhook with Telegram; the kernel spreads
+    incoming connections across all workers bound with SO_REUSEPORT, so
+    consecutive updates from one user can land on different workers.
+
+    Conversation states must then be shared, so more than one worker needs
+    FSM_STORAGE=sqlite. The ingest journal keeps one file per worker. All
+    other state is per process:
+
+    - album buffers: an album split across workers is saved in parts, with
+      one summary reply per part;
+    - caches invalidated on write (users, category lists, file counts,
+      rendered pages, downloads, inline results): other workers serve stale
+      entries until their TTL expires, at most ten minutes;
+    - replica pins: read-your-writes only holds on the worker that wrote;
+    - throttle and outbound send buckets: limits apply per worker, so
+      OUTBOUND_GLOBAL_RATE should be Telegram's limit divided by the workers.
+    """
+    if WEBHOOK_WORKERS > 1 and FSM_STORAGE == "memory":
+        raise ValueError("WEBHOOK_WORKERS > 1 requires FSM_STORAGE=sqlite")
+
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(
+            target=_run_worker, args=(concurrency_limit, worker_index), daemon=True
+        )
+        for worker_index in range(1, WEBHOOK_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        await serve_webhook(bot, dp, concurrency_limit, register_webhook=True)
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+
+
+def _run_worker(concurrency_limit: int, worker_index: int):
+    from app.bot import create_bot, create_dispatcher
+
+    try:
+        asyncio.run(
+            serve_webhook(
+                create_bot(),
+                create_dispatcher(),
+                concurrency_limit,
+                register_webhook=False,
+                worker_index=worker_index,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,230 @@
+"""End-to-end load test for the bot.
+
+Feeds synthetic updates into the real dispatcher from app.bot while every
+Bot API call goes to a local FakeBotAPI. Uses the database configured in
+.env, so point it at a disposable database.
+
+    python -m loadtest --users 200 --updates 5000 --concurrency 50 \\
+        --mix start=1,upload=6,album=1,page=6,get=3,category=1 \\
+        --api-latency 0.05 --rate-limit 0.01
+"""
+
+import argparse
+import asyncio
+import random
+import resource
+import statistics
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from itertools import count
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Update
+from sqlalchemy import event
+
+from app.bot import create_bot, create_dispatcher
+from app.database import engine
+from loadtest.fake_bot_api import FakeBotAPI
+
+USER_ID_BASE = 9_000_000_000
+
+
+class LoadTest:
+    """Generates a weighted mix of user actions and measures how the bot copes"""
+
+    def __init__(self, api: FakeBotAPI, users: int, skew: float, mix: dict[str, float]):
+        self.api = api
+        self.users = users
+        self.user_weights = [1 / (rank**skew) for rank in range(1, users + 1)]
+        self.actions = list(mix)
+        self.action_weights = [mix[action] for action in self.actions]
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: Counter[str] = Counter()
+        self.throttled: Counter[str] = Counter()
+        self.statements = 0
+        self._ids = count(1)
+
+    def pick_user(self) -> int:
+        rank = random.choices(range(self.users), weights=self.user_weights)[0]
+        return USER_ID_BASE + rank
+
+    async def run(self, bot, dp, total: int, concurrency: int):
+        remaining = count()
+
+        async def worker():
+            while next(remaining) < total:
+                action = random.choices(self.actions, weights=self.action_weights)[0]
+                await getattr(self, f"do_{action}")(bot, dp, self.pick_user())
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def feed(self, bot, dp, label: str, update: dict):
+        started = time.perf_counter()
+        passed = []
+        try:
+            await dp.feed_update(bot, Update.model_validate(update), loadtest_passed=passed)
+        except Exception as e:
+            self.errors[f"{label}: {type(e).__name__}"] += 1
+        if not passed:
+            # Rejected by throttling in next to no time; kept out of the latencies
+            self.throttled[label] += 1
+            return
+        self.latencies[label].append(time.perf_counter() - started)
+
+    def message(self, user_id: int, **content) -> dict:
+        return {
+            "update_id": next(self._ids),
+            "message": {
+                "message_id": next(self._ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+                **content,
+            },
+        }
+
+    def callback(self, user_id: int, data: str) -> dict:
+        return {
+            "update_id": next(self._ids),
+            "callback_query": {
+                "id": str(next(self._ids)),
+                "chat_instance": str(user_id),
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+                "data": data,
+                "message": {
+                    "message_id": next(self._ids),
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "text": "menu",
+                },
+            },
+        }
+
+    def document(self) -> dict:
+        n = next(self._ids)
+        return {
+            "file_id": f"doc-{n}",
+            "file_unique_id": f"u{n % 5000}",
+            "file_name": f"report-{n}.pdf",
+            "mime_type": "application/pdf",
+            "file_size": random.randint(10_000, 5_000_000),
+        }
+
+    async def do_start(self, bot, dp, user_id: int):
+        await self.feed(bot, dp, "start", self.message(user_id, text="/start"))
+
+    async def do_upload(self, bot, dp, user_id: int):
+        await self.feed(bot, dp, "upload", self.message(user_id, document=self.document()))
+
+    async def do_album(self, bot, dp, user_id: int):
+        group_id = str(next(self._ids))
+        await asyncio.gather(
+            *(
+                self.feed(
+                    bot,
+                    dp,
+                    "album",
+                    self.message(user_id, media_group_id=group_id, document=self.document()),
+                )
+                for _ in range(random.randint(2, 10))
+            )
+        )
+
+    async def do_page(self, bot, dp, user_id: int):
+        next_pages = self.api.buttons(user_id, prefix="files_page_", text="Next")
+        data = next_pages[0] if next_pages else "menu_my_files"
+        await self.feed(bot, dp, "page", self.callback(user_id, data))
+
+    async def do_get(self, bot, dp, user_id: int):
+        file_ids = self.api.file_ids.get(user_id)
+        if not file_ids:
+            return await self.do_upload(bot, dp, user_id)
+        text = f"/get {random.choice(list(file_ids))}"
+        await self.feed(bot, dp, "get", self.message(user_id, text=text))
+
+    async def do_category(self, bot, dp, user_id: int):
+        await self.feed(bot, dp, "category", self.callback(user_id, "switch_category"))
+        choices = self.api.buttons(user_id, prefix="select_category_")
+        if choices:
+            await self.feed(bot, dp, "category", self.callback(user_id, random.choice(choices)))
+
+
+async def mark_passed(handler, event, data):
+    """Update middleware registered after throttling, noting updates it let through"""
+    data["loadtest_passed"].append(True)
+    return await handler(event, data)
+
+
+def percentile(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, weight = part.split("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+async def main(args):
+    api = FakeBotAPI(latency=args.api_latency, rate_limit_ratio=args.rate_limit)
+    base_url = await api.start()
+    session = AiohttpSession(api=TelegramAPIServer.from_base(base_url))
+    bot = create_bot(session=session)
+    dp = create_dispatcher()
+    dp.update.middleware(mark_passed)
+    test = LoadTest(api, args.users, args.skew, parse_mix(args.mix))
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def count_statement(*_):
+        test.statements += 1
+
+    # Same startup data as polling, so the journal, replicas and metrics run
+    workflow_data = {"dispatcher": dp, "bots": [bot], "bot": bot, **dp.workflow_data}
+    await dp.emit_startup(**workflow_data)
+
+    tracemalloc.start()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    try:
+        await test.run(bot, dp, args.updates, args.concurrency)
+    finally:
+        elapsed = time.perf_counter() - started
+        memory_after = tracemalloc.get_traced_memory()[0]
+        await dp.emit_shutdown(**workflow_data)
+        await bot.session.close()
+        await api.stop()
+        await engine.dispose()
+
+    updates = sum(len(v) for v in test.latencies.values())
+    print(f"updates:         {updates} in {elapsed:.1f}s ({updates / elapsed:.1f}/s)")
+    print(f"queries/update:  {test.statements / max(updates, 1):.2f}")
+    print(f"throttled:       {sum(test.throttled.values())} (not in updates or latencies)")
+    print(f"api calls:       {sum(api.calls.values())} ({sum(api.rate_limited.values())} got 429)")
+    print(
+        f"memory growth:   {(memory_after - memory_before) / 1024:.0f} KiB traced, "
+        f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB"
+    )
+    print(f"{'action':<10} {'count':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for action, values in sorted(test.latencies.items()):
+        print(
+            f"{action:<10} {len(values):>7} "
+            f"{percentile(values, 50) * 1000:>8.1f} {percentile(values, 99) * 1000:>8.1f}"
+        )
+    for error, n in test.errors.most_common():
+        print(f"error: {error} x{n}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent for user activity")
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mix", default="start=1,upload=6,album=1,page=6,get=3,category=1")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="Mean fake API latency (s)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Share of API calls answered 429")
+    asyncio.run(main(parser.parse_args()))
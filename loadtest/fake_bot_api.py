@@ -0,0 +1,103 @@
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from itertools import count
+
+from aiohttp import web
+
+# File ids the bot reports, e.g. "ID: <code>3xYz1</code>" or "<b>ID:</b> <code>3xYz1</code>"
+_FILE_ID = re.compile(r"ID:(?:</b>)? <code>(\w+)</code>")
+
+
+class FakeBotAPI:
+    """Local stand-in for the Telegram Bot API.
+
+    Answers every method with a plausible result, records each call and
+    what the bot showed to each chat, and can add latency and 429s.
+    """
+
+    def __init__(self, latency: float = 0.0, rate_limit_ratio: float = 0.0):
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.calls: Counter[str] = Counter()
+        self.rate_limited: Counter[str] = Counter()
+        self.latencies: list[float] = []
+        self.last_markup: dict[int, list[dict]] = {}
+        self.file_ids: dict[int, dict[str, None]] = defaultdict(dict)
+        self._message_ids = count(1_000_000)
+        self._runner: web.AppRunner | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the base URL for TelegramAPIServer.from_base"""
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{bound_port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        started = time.perf_counter()
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+
+        if self.latency:
+            await asyncio.sleep(random.expovariate(1 / self.latency))
+
+        if random.random() < self.rate_limit_ratio:
+            self.rate_limited[method] += 1
+            return web.json_response(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1},
+                }
+            )
+
+        result = self._result(method.lower(), params)
+        self.latencies.append(time.perf_counter() - started)
+        return web.json_response({"ok": True, "result": result})
+
+    def _result(self, method: str, params: dict):
+        if method == "getme":
+            return {"id": 1, "is_bot": True, "first_name": "FileVault", "username": "vault_bot"}
+
+        chat_id = int(params.get("chat_id") or 0)
+        text = params.get("text") or params.get("caption") or ""
+        self.file_ids[chat_id].update(dict.fromkeys(_FILE_ID.findall(text)))
+
+        if "reply_markup" in params:
+            markup = json.loads(params["reply_markup"])
+            self.last_markup[chat_id] = [
+                button for row in markup.get("inline_keyboard", []) for button in row
+            ]
+
+        if method.startswith(("send", "edit")) and chat_id:
+            return {
+                "message_id": int(params.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": text,
+            }
+        return True
+
+    def buttons(self, chat_id: int, prefix: str = "", text: str = "") -> list[str]:
+        """Callback data of buttons last shown to a chat, filtered by data prefix or label"""
+        return [
+            button["callback_data"]
+            for button in self.last_markup.get(chat_id, [])
+            if "callback_data" in button
+            and button["callback_data"].startswith(prefix)
+            and text in button["text"]
+        ]
@@ -0,0 +1,12 @@
+import os
+
+# Settings without defaults; nothing in the tests connects with them
+for name, value in {
+    "BOT_TOKEN": "123456:test",
+    "DB_USER": "test",
+    "DB_PASSWORD": "test",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_NAME": "test",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,72 @@
+import re
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from sqlalchemy.dialects import postgresql
+
+from app.services import category_service, file_service
+
+USER = SimpleNamespace(id=42, username="alice", first_name="Alice", last_name=None)
+FILE_DATA = {
+    "name": "report.pdf",
+    "mime_type": "application/pdf",
+    "kind": "document",
+    "size": 1024,
+    "telegram_file_id": "BQACAgIAAxkBAAI",
+    "telegram_file_unique_id": "AgADBQAC",
+}
+
+
+class IngestStatementTest(unittest.TestCase):
+    def setUp(self):
+        stmt = file_service._ingest_statement(USER, [FILE_DATA], ["3xYz1"])
+        self.compiled = stmt.compile(dialect=postgresql.dialect())
+
+    def test_file_path_is_inserted_explicitly(self):
+        insert = re.search(r"INSERT INTO files \(([^)]*)\)", str(self.compiled))
+        self.assertIn("file_path", insert.group(1).split(", "))
+        self.assertIn("telegram_storage", self.compiled.params.values())
+        self.assertEqual(self.compiled.insert_prefetch, [])
+
+    def test_upload_values_are_bound(self):
+        params = self.compiled.params.values()
+        for value in ("3xYz1", *FILE_DATA.values(), USER.id):
+            self.assertIn(value, params)
+
+
+class IngestFilesTest(unittest.IsolatedAsyncioTestCase):
+    async def test_no_rows_raises(self):
+        session = mock.AsyncMock()
+        session.info = {}
+        session.execute.return_value = mock.Mock(all=mock.Mock(return_value=[]))
+
+        with mock.patch.object(
+            file_service.file_ids, "allocate", mock.AsyncMock(return_value=["3xYz1"])
+        ), mock.patch.object(file_service, "journal", None):
+            with self.assertRaises(RuntimeError):
+                await file_service.ingest_files(session, USER, [FILE_DATA])
+
+        self.assertEqual(session.execute.await_count, 2)
+
+    async def test_moved_files_drop_cached_categories(self):
+        moved = SimpleNamespace(
+            user_id=USER.id, telegram_file_unique_id=FILE_DATA["telegram_file_unique_id"]
+        )
+        row = mock.MagicMock(category_id=7, category_name="Work")
+        row.__iter__.return_value = iter((moved, False, 7, "Work"))
+        session = mock.AsyncMock()
+        session.info = {}
+        session.execute.return_value = mock.Mock(all=mock.Mock(return_value=[row]))
+        category_service._user_categories_cache.set(
+            USER.id, [category_service.CategoryRef(7, "Work")]
+        )
+
+        with mock.patch.object(
+            file_service.file_ids, "allocate", mock.AsyncMock(return_value=["3xYz1"])
+        ), mock.patch.object(file_service, "journal", None):
+            await file_service.ingest_files(session, USER, [FILE_DATA])
+        for callback in session.info["after_commit"]:
+            callback()
+
+        self.assertIsNone(category_service._user_categories_cache.get(USER.id))
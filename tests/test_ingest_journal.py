@@ -0,0 +1,97 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from sqlalchemy.exc import IntegrityError
+
+from app.services.ingest_journal import IngestJournal
+
+
+class RecordingJournal(IngestJournal):
+    def __init__(self, directory, inserted, fail=None, **kwargs):
+        super().__init__(directory, flush_interval=3600, **kwargs)
+        self.inserted = inserted
+        self.fail = fail
+
+    async def _insert(self, rows):
+        if self.fail:
+            raise self.fail
+        self.inserted.extend(row["unique_id"] for row in rows)
+
+
+class IngestJournalTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.inserted = []
+
+    async def test_workers_flush_each_row_once(self):
+        workers = [RecordingJournal(self.directory, self.inserted) for _ in range(3)]
+        for index, worker in enumerate(workers):
+            await worker.start(worker_index=index)
+
+        await asyncio.gather(
+            *(
+                worker.append({"unique_id": f"{index}-{n}"})
+                for index, worker in enumerate(workers)
+                for n in range(20)
+            )
+        )
+        await asyncio.gather(*(worker.flush() for worker in workers))
+        for worker in workers:
+            await worker.stop()
+
+        self.assertEqual(len(self.inserted), 60)
+        self.assertEqual(len(set(self.inserted)), 60)
+
+    async def test_abandoned_active_file_is_replayed(self):
+        (self.directory / "active-7.jsonl").write_text('{"unique_id": "left"}\n')
+        worker = RecordingJournal(self.directory, self.inserted)
+        await worker.start()
+        await worker.stop()
+
+        self.assertEqual(self.inserted, ["left"])
+
+    async def test_failing_segment_is_quarantined(self):
+        poison = IntegrityError("INSERT", {}, Exception("bad row"))
+        worker = RecordingJournal(
+            self.directory, self.inserted, fail=poison, flush_attempts=2
+        )
+        await worker.start()
+        await worker.append({"unique_id": "bad"})
+        await worker.flush()
+        self.assertEqual(len(list(self.directory.glob("segment-*"))), 1)
+
+        await worker.flush()
+        worker.fail = None
+        await worker.append({"unique_id": "good"})
+        await worker.stop()
+
+        self.assertEqual(len(list(self.directory.glob("failed-*"))), 1)
+        self.assertEqual(self.inserted, ["good"])
+
+    async def test_lost_connection_is_not_counted(self):
+        worker = RecordingJournal(
+            self.directory, self.inserted, fail=ConnectionRefusedError(), flush_attempts=1
+        )
+        await worker.start()
+        await worker.append({"unique_id": "kept"})
+        await worker.flush()
+        worker.fail = None
+        await worker.stop()
+
+        self.assertEqual(self.inserted, ["kept"])
+        self.assertEqual(list(self.directory.glob("failed-*")), [])
+
+    async def test_pending_rows_until_flushed(self):
+        worker = RecordingJournal(self.directory, self.inserted)
+        await worker.start()
+        row = {"unique_id": "first", "user_id": 1, "telegram_file_unique_id": "AgAD"}
+        waiter = worker.append(row)
+        self.assertIs(worker.pending(1, "AgAD"), row)
+        self.assertIsNone(worker.pending(2, "AgAD"))
+
+        await waiter
+        await worker.flush()
+        self.assertIsNone(worker.pending(1, "AgAD"))
+        await worker.stop()
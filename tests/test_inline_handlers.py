@@ -0,0 +1,48 @@
+import unittest
+from datetime import datetime, timezone
+
+from aiogram.types import (
+    InlineQueryResultCachedDocument,
+    InlineQueryResultCachedPhoto,
+    InlineQueryResultCachedVideo,
+)
+
+from app.handlers.inline_handlers import inline_result
+from app.services.file_service import FileRow
+
+
+def row(kind, mime_type, name="clip.mp4"):
+    return FileRow(
+        id=1,
+        unique_id="3xYz1",
+        name=name,
+        mime_type=mime_type,
+        kind=kind,
+        telegram_file_id="BAACAgIAAxkB",
+        created_at=datetime.now(timezone.utc),
+    )
+
+
+class InlineResultTest(unittest.TestCase):
+    def test_type_follows_upload_kind(self):
+        self.assertIsInstance(
+            inline_result(row("video", "video/mp4")), InlineQueryResultCachedVideo
+        )
+        self.assertIsInstance(
+            inline_result(row("photo", "unknown/type")), InlineQueryResultCachedPhoto
+        )
+
+    def test_video_sent_as_document_stays_a_document(self):
+        self.assertIsInstance(
+            inline_result(row("document", "video/mp4")), InlineQueryResultCachedDocument
+        )
+
+    def test_unknown_kind_falls_back_to_document(self):
+        self.assertIsInstance(
+            inline_result(row(None, None)), InlineQueryResultCachedDocument
+        )
+
+    def test_caption_escapes_file_name(self):
+        result = inline_result(row("document", "text/plain", name="a<b> & c.txt"))
+        self.assertIn("<b>a&lt;b&gt; &amp; c.txt</b>", result.caption)
+        self.assertEqual(result.title, "a<b> & c.txt")
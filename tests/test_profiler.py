@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+
+from app.profiler import SlowUpdateProfiler, UpdateProfile, coroutine_stack
+
+
+async def inner(event: asyncio.Event):
+    await event.wait()
+
+
+async def middle(event: asyncio.Event):
+    await inner(event)
+
+
+async def outer(event: asyncio.Event):
+    await middle(event)
+
+
+class CoroutineStackTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.event = asyncio.Event()
+        self.task = asyncio.create_task(outer(self.event))
+        await asyncio.sleep(0)
+
+    async def asyncTearDown(self):
+        self.event.set()
+        await self.task
+
+    async def test_follows_awaits_to_innermost_frame(self):
+        names = [frame.f_code.co_name for frame in coroutine_stack(self.task.get_coro())]
+        self.assertEqual(names[:3], ["outer", "middle", "inner"])
+
+    async def test_sample_includes_inner_frame(self):
+        profiler = SlowUpdateProfiler(stack_interval=0.001)
+        profile = UpdateProfile(self.task)
+        profiler._active.add(profile)
+        sampler = asyncio.create_task(profiler._sample_stacks())
+        await asyncio.sleep(0.01)
+        profiler._active.clear()
+        await sampler
+
+        stack = profile.stacks.most_common(1)[0][0]
+        self.assertTrue(stack.startswith("Event.wait"), stack)
+        self.assertIn("inner (test_profiler.py", stack)
+        self.assertIn("outer (test_profiler.py", stack)
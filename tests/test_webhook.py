@@ -0,0 +1,42 @@
+import json
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.webhook import LimitedRequestHandler
+
+
+def request(update):
+    request = MagicMock()
+    request.json = AsyncMock(return_value=update)
+    return request
+
+
+def bot():
+    bot = MagicMock()
+    bot.session.json_dumps = json.dumps
+    return bot
+
+
+class BackgroundHandlingTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.handler = LimitedRequestHandler(
+            dispatcher=MagicMock(),
+            bot=MagicMock(),
+            concurrency_limit=1,
+            handle_in_background=True,
+        )
+        self.handler._handle_request = AsyncMock()
+        self.handler._background_feed_update = AsyncMock()
+
+    async def test_uploads_are_handled_before_answering(self):
+        update = {"update_id": 1, "message": {"document": {"file_id": "BQAC"}}}
+        await self.handler._handle_request_background(bot(), request(update))
+        self.handler._handle_request.assert_awaited_once()
+        self.handler._background_feed_update.assert_not_called()
+
+    async def test_other_updates_stay_in_background(self):
+        update = {"update_id": 1, "message": {"text": "/start"}}
+        await self.handler._handle_request_background(bot(), request(update))
+        await self.handler._background_feed_update_tasks.pop()
+        self.handler._handle_request.assert_not_called()
+        self.handler._background_feed_update.assert_awaited_once()